@@ -1,137 +1,261 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import jwt
 import datetime
-from functools import wraps
 import os
+import threading
+from contextlib import contextmanager
 import requests
 
+# common -> modul bersama mnt/user-data/outputs/digital-wallet/common
+from common.auth import TokenVerifier, identity_header
+from common.events import EventPublisher
+from user_cache import UserExistenceCache
+from wal import WALError, WriteAheadLog
+from wallet_store import MAX_BALANCE, WalletStore
+
 app = Flask(__name__)
 from flask_cors import CORS
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'digital-wallet-secret-key-2024')
+INTERNAL_IDENTITY_KEY = os.getenv('INTERNAL_IDENTITY_KEY', '')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
 USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://localhost:5001')
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 5))
+WALLET_LOCK_STRIPES = int(os.getenv('WALLET_LOCK_STRIPES', 256))
+WALLET_BATCH_MAX = int(os.getenv('WALLET_BATCH_MAX', 10000))
+# Event hub api-gateway untuk SSE /api/events (kosong = nonaktif)
+EVENTS_URL = os.getenv('EVENTS_URL', 'http://localhost:5050/internal/events')
 
-# Database wallet (in-memory)
-wallets_db = {
-    1: {
-        'id': 1,
-        'user_id': 1,
-        'balance': 1000000,
-        'currency': 'IDR',
-        'status': 'active'
-    },
-    2: {
-        'id': 2,
-        'user_id': 2,
-        'balance': 500000,
-        'currency': 'IDR',
-        'status': 'active'
-    },
-    3: {
-        'id': 3,
-        'user_id': 3,
-        'balance': 750000,
-        'currency': 'IDR',
-        'status': 'active'
-    }
-}
-
-next_wallet_id = 4
-
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        return f(current_user_id, *args, **kwargs)
-    
-    return decorated
+# Cache hasil verifikasi user ke user-service
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 100000))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+USER_CACHE_NEGATIVE_TTL = int(os.getenv('USER_CACHE_NEGATIVE_TTL', 30))
 
-def verify_user_exists(user_id, token):
-    """Verify user exists by calling user-service"""
+# Write-ahead log saldo wallet
+WALLET_WAL_ENABLED = os.getenv('WALLET_WAL_ENABLED', 'true').lower() == 'true'
+WALLET_WAL_FSYNC = os.getenv('WALLET_WAL_FSYNC', 'true').lower() == 'true'
+WALLET_DATA_DIR = os.getenv('WALLET_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+WALLET_SNAPSHOT_INTERVAL = int(os.getenv('WALLET_SNAPSHOT_INTERVAL', 60))
+
+# Database wallet (in-memory), disimpan per kolom di array (lihat wallet_store.py)
+wallets_db = WalletStore()
+wallets_db.create(1, 1000000)
+wallets_db.create(2, 500000)
+wallets_db.create(3, 750000)
+
+wallets_lock = threading.Lock()
+
+# Lock per wallet (di-stripe): wallet berbeda bisa berubah paralel,
+# perubahan pada wallet yang sama berurutan
+wallet_stripes = [threading.Lock() for _ in range(WALLET_LOCK_STRIPES)]
+
+def wallet_lock(wallet_id):
+    return wallet_stripes[wallet_id % WALLET_LOCK_STRIPES]
+
+@contextmanager
+def wallet_locks(wallet_ids):
+    """Lock beberapa wallet sekaligus; stripe diambil berurutan supaya tidak deadlock"""
+    stripes = sorted({wallet_id % WALLET_LOCK_STRIPES for wallet_id in wallet_ids})
+    for stripe in stripes:
+        wallet_stripes[stripe].acquire()
     try:
-        headers = {'Authorization': f'Bearer {token}'}
+        yield
+    finally:
+        for stripe in reversed(stripes):
+            wallet_stripes[stripe].release()
+
+# Semua perubahan wallet dicatat di WAL (wal.py) dan baru diterapkan ke memory
+# setelah record-nya tersimpan. Saat start, wallets_db dibangun ulang dari
+# snapshot + sisa log.
+wallet_log = WriteAheadLog(
+    WALLET_DATA_DIR if WALLET_WAL_ENABLED else None,
+    fsync=WALLET_WAL_FSYNC, snapshot_interval=WALLET_SNAPSHOT_INTERVAL
+)
+
+def load_wallet_snapshot(state):
+    wallets_db.clear()
+    if 'columns' in state:
+        wallets_db.load(state['columns'])
+        return
+    # Snapshot lama: list wallet dict
+    for wallet in state['wallets']:
+        wallets_db.put(wallet['id'], wallet['user_id'], wallet['balance'],
+                       wallet['currency'], wallet['status'])
+
+def apply_wallet_record(record):
+    """Replay satu record WAL (nilai absolut, jadi aman di-replay ulang)"""
+    if record['op'] == 'create':
+        wallets_db.put(record['id'], record['user_id'])
+    elif record['op'] == 'balance':
+        wallets_db.set_balance(record['id'], record['balance'])
+    elif record['op'] == 'balances':
+        # Transfer/batch: semua saldo dalam satu record, jadi tidak pernah setengah jalan
+        for wallet_id, balance in record['balances']:
+            wallets_db.set_balance(wallet_id, balance)
+
+def wallet_snapshot_state():
+    # Disalin sambil memegang semua lock, jadi setiap record yang sudah di-log
+    # juga sudah diterapkan; encode base64 dilakukan setelah lock dilepas
+    with wallets_lock, wallet_locks(range(WALLET_LOCK_STRIPES)):
+        copied = wallets_db.copy()
+    return {'columns': copied.dump()}
+
+_recovered = wallet_log.recover(load_wallet_snapshot, apply_wallet_record)
+wallet_log.start(wallet_snapshot_state)
+if wallet_log.enabled and not _recovered:
+    # Start pertama: simpan data awal
+    wallet_log.snapshot()
+
+# Index user_id -> wallet id (satu wallet per user), dijaga di create_wallet
+wallets_by_user = {wallets_db.user_id(wallet_id): wallet_id for wallet_id in wallets_db.ids()}
+
+def user_wallets(user_id):
+    wallet_id = wallets_by_user.get(user_id)
+    return [wallets_db.to_dict(wallet_id)] if wallet_id is not None else []
+
+def find_wallet(wallet_id):
+    """Id wallet dari body JSON (bisa bukan integer, termasuk true/false), atau None jika tidak ada"""
+    return wallet_id if wallet_id in wallets_db else None
+
+def valid_amount(amount):
+    """Nominal harus integer positif (saldo disimpan sebagai int64)"""
+    return isinstance(amount, int) and not isinstance(amount, bool) and 0 < amount <= MAX_BALANCE
+
+# Perubahan saldo dikirim ke api-gateway (SSE). publish() dipanggil di bawah
+# lock wallet supaya event satu wallet keluar berurutan.
+event_publisher = EventPublisher(EVENTS_URL, SECRET_KEY, timeout=REQUEST_TIMEOUT)
+
+def publish_balance(wallet_id):
+    wallet = wallets_db.to_dict(wallet_id)
+    event_publisher.publish(wallet['user_id'], 'wallet.balance', wallet)
+    return wallet
+
+def change_balance(wallet_id, amount):
+    """Tambah (atau kurangi, amount < 0) saldo secara atomic.
+
+    Return wallet setelah perubahan, atau None jika saldo jadi negatif
+    atau melewati MAX_BALANCE.
+    """
+    with wallet_lock(wallet_id):
+        balance = wallets_db.balance(wallet_id) + amount
+        if not 0 <= balance <= MAX_BALANCE:
+            return None
+        # Saldo baru diubah setelah record tersimpan; jika gagal (WALError)
+        # memory tetap sama dan tidak ada event. Wallet di stripe lain tetap
+        # bisa ikut satu fsync (group commit).
+        wallet_log.append({'op': 'balance', 'id': wallet_id, 'balance': balance}).wait()
+        wallets_db.set_balance(wallet_id, balance)
+        return publish_balance(wallet_id)
+
+# Verifikasi JWT (common/auth.py), hasil verifikasi di-cache sampai token expire
+token_verifier = TokenVerifier(SECRET_KEY, INTERNAL_IDENTITY_KEY, max_entries=TOKEN_CACHE_SIZE)
+token_required = token_verifier.required
+
+def fetch_user_exists(user_id, token):
+    """Tanya user-service; None jika jawabannya tidak pasti (timeout, error, token ditolak)"""
+    try:
+        headers = {'Authorization': f'Bearer {token}', **identity_header()}
         response = requests.get(
             f'{USER_SERVICE_URL}/users/{user_id}',
             headers=headers,
             timeout=REQUEST_TIMEOUT
         )
-        return response.status_code == 200
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        return None
     except requests.exceptions.Timeout:
-        return False
+        return None
     except requests.exceptions.RequestException:
-        return False
+        return None
+
+user_cache = UserExistenceCache(
+    fetch_user_exists, max_entries=USER_CACHE_SIZE,
+    ttl=USER_CACHE_TTL, negative_ttl=USER_CACHE_NEGATIVE_TTL
+)
+
+def verify_user_exists(user_id, token):
+    """Verify user exists (cached, lihat user_cache.py)"""
+    return user_cache.exists(user_id, token)
 
 @app.route('/health', methods=['GET'])
 def health_check():
+    if wallet_log.broken:
+        # WAL berhenti setelah write gagal; perlu restart untuk recovery
+        return jsonify({
+            'service': 'wallet-service',
+            'status': 'unhealthy',
+            'error': 'Write-ahead log stopped, restart required',
+            'timestamp': datetime.datetime.now().isoformat()
+        }), 503
     return jsonify({
         'service': 'wallet-service',
         'status': 'healthy',
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'service': 'wallet-service',
+        'token_cache': token_verifier.stats(),
+        'wal': wallet_log.stats(),
+        'user_cache': user_cache.stats(),
+        'events': event_publisher.stats()
+    })
+
+@app.route('/internal/users/<int:user_id>/invalidate', methods=['POST'])
+@token_required
+def invalidate_user(current_user_id, user_id):
+    """Hook dari user-service saat user dihapus (internal use)"""
+    user_cache.invalidate(user_id)
+    return jsonify({'message': 'User cache invalidated'})
+
+@app.errorhandler(WALError)
+def wal_error(error):
+    # Write WAL gagal: WAL berhenti total (lihat wal.py), semua perubahan berikutnya
+    # ditolak dengan 503 sampai service di-restart dan recovery dari disk
+    return jsonify({'error': 'Failed to persist wallet change', 'message': str(error)}), 503
+
 @app.route('/wallets', methods=['GET'])
 @token_required
 def get_wallets(current_user_id):
     """Get all wallets for current user"""
-    user_wallets = [w for w in wallets_db.values() if w['user_id'] == current_user_id]
-    return jsonify({'wallets': user_wallets})
+    return jsonify({'wallets': user_wallets(current_user_id)})
 
 @app.route('/wallets/<int:wallet_id>', methods=['GET'])
 @token_required
 def get_wallet(current_user_id, wallet_id):
     """Get wallet by ID"""
-    wallet = wallets_db.get(wallet_id)
-    
-    if not wallet:
+    if wallet_id not in wallets_db:
         return jsonify({'error': 'Wallet not found'}), 404
     
-    if wallet['user_id'] != current_user_id:
+    if wallets_db.user_id(wallet_id) != current_user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    return jsonify({'wallet': wallet})
+    return jsonify({'wallet': wallets_db.to_dict(wallet_id)})
 
 @app.route('/wallets', methods=['POST'])
 @token_required
 def create_wallet(current_user_id):
     """Create new wallet"""
-    global next_wallet_id
-    
     # Verify user exists
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     if not verify_user_exists(current_user_id, token):
         return jsonify({'error': 'User verification failed'}), 400
     
-    # Check if user already has a wallet
-    for wallet in wallets_db.values():
-        if wallet['user_id'] == current_user_id:
+    with wallets_lock:
+        # Check if user already has a wallet
+        if current_user_id in wallets_by_user:
             return jsonify({'error': 'User already has a wallet'}), 400
-    
-    new_wallet = {
-        'id': next_wallet_id,
-        'user_id': current_user_id,
-        'balance': 0,
-        'currency': 'IDR',
-        'status': 'active'
-    }
-    wallets_db[next_wallet_id] = new_wallet
-    next_wallet_id += 1
+        
+        wallet_id = wallets_db.next_id
+        wallet_log.append({'op': 'create', 'id': wallet_id, 'user_id': current_user_id}).wait()
+        wallets_db.put(wallet_id, current_user_id)
+        wallets_by_user[current_user_id] = wallet_id
+        new_wallet = wallets_db.to_dict(wallet_id)
     
     return jsonify({'wallet': new_wallet}), 201
 
@@ -139,39 +263,37 @@ def create_wallet(current_user_id):
 @token_required
 def get_balance(current_user_id, wallet_id):
     """Get wallet balance"""
-    wallet = wallets_db.get(wallet_id)
-    
-    if not wallet:
+    if wallet_id not in wallets_db:
         return jsonify({'error': 'Wallet not found'}), 404
     
-    if wallet['user_id'] != current_user_id:
+    if wallets_db.user_id(wallet_id) != current_user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
     return jsonify({
-        'wallet_id': wallet['id'],
-        'balance': wallet['balance'],
-        'currency': wallet['currency']
+        'wallet_id': wallet_id,
+        'balance': wallets_db.balance(wallet_id),
+        'currency': wallets_db.currency(wallet_id)
     })
 
 @app.route('/wallets/<int:wallet_id>/topup', methods=['POST'])
 @token_required
 def topup_wallet(current_user_id, wallet_id):
     """Top up wallet balance"""
-    wallet = wallets_db.get(wallet_id)
-    
-    if not wallet:
+    if wallet_id not in wallets_db:
         return jsonify({'error': 'Wallet not found'}), 404
     
-    if wallet['user_id'] != current_user_id:
+    if wallets_db.user_id(wallet_id) != current_user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
     amount = data.get('amount', 0)
     
-    if amount <= 0:
+    if not valid_amount(amount):
         return jsonify({'error': 'Invalid amount'}), 400
     
-    wallet['balance'] += amount
+    wallet = change_balance(wallet_id, amount)
+    if wallet is None:
+        return jsonify({'error': 'Balance limit exceeded'}), 400
     
     return jsonify({
         'message': 'Top up successful',
@@ -182,37 +304,176 @@ def topup_wallet(current_user_id, wallet_id):
 @token_required
 def deduct_wallet(current_user_id, wallet_id):
     """Deduct wallet balance (internal use)"""
-    wallet = wallets_db.get(wallet_id)
-    
-    if not wallet:
+    if wallet_id not in wallets_db:
         return jsonify({'error': 'Wallet not found'}), 404
     
-    if wallet['user_id'] != current_user_id:
+    if wallets_db.user_id(wallet_id) != current_user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
     amount = data.get('amount', 0)
     
-    if amount <= 0:
+    if not valid_amount(amount):
         return jsonify({'error': 'Invalid amount'}), 400
     
-    if wallet['balance'] < amount:
+    wallet = change_balance(wallet_id, -amount)
+    if wallet is None:
         return jsonify({'error': 'Insufficient balance'}), 400
     
-    wallet['balance'] -= amount
-    
     return jsonify({
         'message': 'Deduction successful',
         'wallet': wallet
     })
 
+@app.route('/wallets/transfer', methods=['POST'])
+@token_required
+def transfer(current_user_id):
+    """Pindahkan saldo antar wallet secara atomic (internal use)
+
+    Body: {"from_wallet_id": 1, "to_user_id": 2, "amount": 1000}
+    (atau "to_wallet_id" sebagai pengganti "to_user_id")
+    """
+    data = request.get_json(silent=True) or {}
+    amount = data.get('amount')
+    
+    if not valid_amount(amount):
+        return jsonify({'error': 'Invalid amount'}), 400
+    
+    from_wallet = find_wallet(data.get('from_wallet_id'))
+    if from_wallet is None or wallets_db.user_id(from_wallet) != current_user_id:
+        return jsonify({'error': 'Invalid source wallet'}), 400
+    
+    if 'to_wallet_id' in data:
+        to_wallet = find_wallet(data['to_wallet_id'])
+        if to_wallet is None:
+            return jsonify({'error': 'Destination wallet not found'}), 404
+    else:
+        to_user_id = data.get('to_user_id')
+        valid_user_id = isinstance(to_user_id, int) and not isinstance(to_user_id, bool)
+        to_wallet = wallets_by_user.get(to_user_id) if valid_user_id else None
+        if to_wallet is None:
+            return jsonify({'error': 'Destination user not found'}), 404
+    
+    if to_wallet == from_wallet:
+        return jsonify({'error': 'Cannot transfer to the same wallet'}), 400
+    
+    with wallet_locks((from_wallet, to_wallet)):
+        from_balance = wallets_db.balance(from_wallet) - amount
+        to_balance = wallets_db.balance(to_wallet) + amount
+        if from_balance < 0:
+            return jsonify({'error': 'Insufficient balance'}), 400
+        if to_balance > MAX_BALANCE:
+            return jsonify({'error': 'Balance limit exceeded'}), 400
+        wallet_log.append({
+            'op': 'balances',
+            'balances': [[from_wallet, from_balance], [to_wallet, to_balance]]
+        }).wait()
+        wallets_db.set_balance(from_wallet, from_balance)
+        wallets_db.set_balance(to_wallet, to_balance)
+        updated = publish_balance(from_wallet)
+        publish_balance(to_wallet)
+    
+    return jsonify({
+        'message': 'Transfer successful',
+        'from_wallet': updated,
+        'to_wallet_id': to_wallet,
+        'to_user_id': wallets_db.user_id(to_wallet),
+        'amount': amount
+    })
+
+# Arah saldo per tipe entry di batch mutation
+BATCH_ENTRY_TYPES = {'credit': 1, 'debit': -1}
+
+@app.route('/wallets/mutations/batch', methods=['POST'])
+@token_verifier.required_or_internal
+def mutate_wallets_batch(current_user_id):
+    """Credit/debit banyak entry dalam satu request
+
+    Body: {"entries": [{"wallet_id": 1, "type": "credit", "amount": 1000}, ...],
+           "atomic": false}
+    Entry diproses berurutan. Dengan atomic=true, satu entry gagal membatalkan semuanya.
+    User hanya boleh mengubah wallet miliknya; service lain yang menandatangani request
+    dengan credential internal (common/auth.py) boleh mengubah wallet siapa saja.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('entries')
+    atomic = data.get('atomic', False)
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'entries required'}), 400
+    if not isinstance(atomic, bool):
+        return jsonify({'error': 'atomic must be a boolean'}), 400
+    if len(entries) > WALLET_BATCH_MAX:
+        return jsonify({'error': f'At most {WALLET_BATCH_MAX} entries per batch'}), 400
+    
+    results = [None] * len(entries)
+    changes = []
+    for index, entry in enumerate(entries):
+        error = None
+        wallet = None
+        if not isinstance(entry, dict) or entry.get('type') not in BATCH_ENTRY_TYPES:
+            error = 'type must be credit or debit'
+        else:
+            amount = entry.get('amount')
+            wallet = find_wallet(entry.get('wallet_id'))
+            if not valid_amount(amount):
+                error = 'Invalid amount'
+            elif wallet is None:
+                error = 'Wallet not found'
+            elif current_user_id is not None and wallets_db.user_id(wallet) != current_user_id:
+                error = 'Unauthorized'
+        
+        if error:
+            wallet_id = entry.get('wallet_id') if isinstance(entry, dict) else None
+            results[index] = {'index': index, 'wallet_id': wallet_id, 'status': 'error', 'error': error}
+        else:
+            changes.append((index, wallet, BATCH_ENTRY_TYPES[entry['type']] * amount))
+    
+    with wallet_locks(wallet for _, wallet, _ in changes):
+        balances = {wallet: wallets_db.balance(wallet) for _, wallet, _ in changes}
+        for index, wallet, amount in changes:
+            balance = balances[wallet] + amount
+            if not 0 <= balance <= MAX_BALANCE:
+                error = 'Insufficient balance' if balance < 0 else 'Balance limit exceeded'
+                results[index] = {'index': index, 'wallet_id': wallet, 'status': 'error', 'error': error}
+                continue
+            balances[wallet] = balance
+            results[index] = {'index': index, 'wallet_id': wallet, 'status': 'ok', 'balance': balance}
+        
+        failed = sum(1 for result in results if result['status'] == 'error')
+        changed = [[wallet_id, balance] for wallet_id, balance in balances.items()
+                   if wallets_db.balance(wallet_id) != balance]
+        if changed and not (atomic and failed):
+            wallet_log.append({'op': 'balances', 'balances': changed}).wait()
+            for wallet_id, balance in changed:
+                wallets_db.set_balance(wallet_id, balance)
+                publish_balance(wallet_id)
+    
+    if atomic and failed:
+        for result in results:
+            if result['status'] == 'ok':
+                result['status'] = 'skipped'
+                del result['balance']
+        return jsonify({
+            'error': 'Batch rejected, no entries applied',
+            'applied': 0,
+            'failed': failed,
+            'results': results
+        }), 400
+    
+    return jsonify({
+        'applied': len(entries) - failed,
+        'failed': failed,
+        'results': results
+    })
+
 @app.route('/wallets/user/<int:user_id>', methods=['GET'])
 @token_required
 def get_wallet_by_user(current_user_id, user_id):
     """Get wallet by user ID (internal use)"""
-    for wallet in wallets_db.values():
-        if wallet['user_id'] == user_id:
-            return jsonify({'wallet': wallet})
+    wallets = user_wallets(user_id)
+    if wallets:
+        return jsonify({'wallet': wallets[0]})
     
     return jsonify({'error': 'Wallet not found'}), 404
 
@@ -0,0 +1,122 @@
+"""Throughput of the api-gateway in sync (Flask) vs async (aiohttp) mode.
+
+Starts a stub wallet-service that answers GET /wallets after UPSTREAM_DELAY,
+then each gateway mode in turn, and fires REQUESTS calls at /api/wallets
+with CONCURRENCY in flight. The response cache and rate limiter are off so
+every call reaches the upstream.
+
+    python benchmarks/gateway_modes.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GATEWAY_DIR = os.path.join(ROOT, 'mnt', 'user-data', 'outputs', 'digital-wallet', 'api-gateway')
+
+UPSTREAM_PORT = 5902
+GATEWAY_PORT = 5903
+UPSTREAM_DELAY = 0.1
+
+
+def run_upstream():
+    async def wallets(request):
+        await asyncio.sleep(UPSTREAM_DELAY)
+        return web.json_response({'wallets': []})
+
+    async def health(request):
+        return web.json_response({'status': 'healthy'})
+
+    app = web.Application()
+    app.router.add_get('/wallets', wallets)
+    app.router.add_get('/health', health)
+    web.run_app(app, port=UPSTREAM_PORT, print=None)
+
+
+def start_gateway(mode):
+    upstream = f'http://localhost:{UPSTREAM_PORT}'
+    env = {
+        **os.environ,
+        'PORT': str(GATEWAY_PORT),
+        'GATEWAY_MODE': mode,
+        'USER_SERVICE_URL': upstream,
+        'WALLET_SERVICE_URL': upstream,
+        'TRANSACTION_SERVICE_URL': upstream,
+        'PAYMENT_SERVICE_URL': upstream,
+        'RESPONSE_CACHE_SIZE': '0',
+        'RATE_LIMIT_ENABLED': 'false',
+        'UPSTREAM_POOL_SIZE': '200'
+    }
+    # threaded Flask without the debug reloader
+    code = ('import app; app.app.run(port=%d, threaded=True)' % GATEWAY_PORT
+            if mode == 'sync' else 'import async_app; async_app.run(%d)' % GATEWAY_PORT)
+    return subprocess.Popen([sys.executable, '-c', code], cwd=GATEWAY_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(url):
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up')
+
+
+async def load(url, requests, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.get(url, headers={'Authorization': 'Bearer x'}) as response:
+                    await response.read()
+                    assert response.status == 200, response.status
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    upstream = subprocess.Popen([sys.executable, __file__, '--upstream'])
+    try:
+        asyncio.run(wait_ready(f'http://localhost:{UPSTREAM_PORT}/health'))
+        print(f'{requests} requests, {concurrency} concurrent, upstream delay {UPSTREAM_DELAY * 1000:.0f} ms')
+        for mode in ('sync', 'async'):
+            gateway = start_gateway(mode)
+            try:
+                url = f'http://localhost:{GATEWAY_PORT}'
+                asyncio.run(wait_ready(f'{url}/metrics'))
+                rate, p50, p99 = asyncio.run(load(f'{url}/api/wallets', requests, concurrency))
+                print(f'  {mode:5}: {rate:6.0f} req/s  p50 {p50 * 1000:5.0f} ms  p99 {p99 * 1000:5.0f} ms')
+            finally:
+                gateway.terminate()
+                gateway.wait()
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--upstream']:
+        run_upstream()
+    else:
+        main()
@@ -0,0 +1,69 @@
+"""Login latency of user-service as users_db grows.
+
+Seeds users_db with N users (through the same indexes register uses) and
+times POST /auth/login through the Flask test client. The scrypt cost is
+lowered via PASSWORD_HASH_N so the email lookup is what is measured; set it
+in the environment to include a realistic KDF.
+
+    python benchmarks/login_lookup.py [users ...]    # default 1000 100000 1000000
+"""
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_SERVICE_DIR = os.path.join(ROOT, 'mnt', 'user-data', 'outputs', 'digital-wallet', 'user-service')
+
+LOGINS = 2000
+WARMUP = 200
+
+
+def run(users):
+    os.environ.setdefault('PASSWORD_HASH_N', '16')
+    sys.path.insert(0, USER_SERVICE_DIR)
+    import app as user_service
+
+    started = time.perf_counter()
+    with user_service.users_lock:
+        for user_id in range(user_service.next_user_id, users + 1):
+            user = {
+                'id': user_id,
+                'name': f'User {user_id}',
+                'email': f'user{user_id}@example.com',
+                'phone': f'08{user_id:010d}',
+                'password': 'password123'
+            }
+            user_service.users_db[user_id] = user
+            user_service.index_user(user)
+            user_service.user_ids.append(user_id)
+        user_service.next_user_id = max(user_service.next_user_id, users + 1)
+    seeded = time.perf_counter() - started
+
+    client = user_service.app.test_client()
+    # Logins of the last seeded user, the worst case for a scan
+    body = {'email': f'user{users}@example.com' if users > 3 else 'john@example.com',
+            'password': 'password123'}
+    for _ in range(WARMUP):
+        assert client.post('/auth/login', json=body).status_code == 200
+
+    started = time.perf_counter()
+    for _ in range(LOGINS):
+        client.post('/auth/login', json=body)
+    elapsed = time.perf_counter() - started
+    print(f'{len(user_service.users_db):>9} users: {elapsed / LOGINS * 1e6:6.0f} us/login'
+          f'  (seeded in {seeded:.1f} s)')
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]
+    for users in sizes:
+        # One process per size so earlier seeds do not skew memory or GC
+        subprocess.run([sys.executable, __file__, '--run', str(users)], check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(int(sys.argv[2]))
+    else:
+        main()
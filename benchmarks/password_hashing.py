@@ -0,0 +1,108 @@
+"""Login throughput of user-service with scrypt hashing on the process pool.
+
+Starts user-service (threaded dev server) for each scrypt cost and number
+of clients, fires LOGINS POST /auth/login calls for the seeded user with
+that many in flight, and polls GET /health alongside to check that other
+requests are still served while the hashing pool is busy.
+
+    python benchmarks/password_hashing.py [logins]    # default 200
+
+PASSWORD_HASH_WORKERS in the environment is passed on to the service.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_SERVICE_DIR = os.path.join(ROOT, 'mnt', 'user-data', 'outputs', 'digital-wallet', 'user-service')
+
+PORT = 5904
+HEALTH_PROBES = 20
+HEALTH_INTERVAL = 0.1
+# (PASSWORD_HASH_N, concurrent clients)
+CASES = [(16384, 1), (16384, 16), (4096, 16)]
+
+
+def start_service(cost):
+    env = {**os.environ, 'PASSWORD_HASH_N': str(cost), 'EVENTS_URL': ''}
+    # threaded Flask without the debug reloader
+    code = 'import app; app.app.run(port=%d, threaded=True)' % PORT
+    # Own process group: the hashing pool is forked from the server and
+    # would otherwise outlive it holding the listening socket
+    return subprocess.Popen([sys.executable, '-c', code], cwd=USER_SERVICE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+async def wait_ready(url):
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up')
+
+
+async def load(url, logins, concurrency):
+    latencies = []
+    health_latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    body = {'email': 'john@example.com', 'password': 'password123'}
+    connector = aiohttp.TCPConnector(limit=concurrency + 4)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # The first login rehashes the seeded plaintext password
+        async with session.post(f'{url}/auth/login', json=body) as response:
+            await response.read()
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(f'{url}/auth/login', json=body) as response:
+                    await response.read()
+                    assert response.status == 200, response.status
+                latencies.append(time.perf_counter() - started)
+
+        async def health():
+            for _ in range(HEALTH_PROBES):
+                started = time.perf_counter()
+                async with session.get(f'{url}/health') as response:
+                    await response.read()
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(HEALTH_INTERVAL)
+
+        started = time.perf_counter()
+        await asyncio.gather(health(), *(one() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    health_latencies.sort()
+    return (logins / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)],
+            health_latencies[int(len(health_latencies) * 0.99)])
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f'{logins} logins per case, {os.cpu_count()} CPU,'
+          f' PASSWORD_HASH_WORKERS={os.getenv("PASSWORD_HASH_WORKERS", "cpu count")}')
+    url = f'http://localhost:{PORT}'
+    for cost, concurrency in CASES:
+        service = start_service(cost)
+        try:
+            asyncio.run(wait_ready(f'{url}/health'))
+            rate, p50, p99, health_p99 = asyncio.run(load(url, logins, concurrency))
+            print(f'  n={cost:<5} {concurrency:2} clients: {rate:6.1f} logins/s  p50 {p50 * 1000:5.0f} ms'
+                  f'  p99 {p99 * 1000:5.0f} ms  /health p99 {health_p99 * 1000:5.1f} ms')
+        finally:
+            os.killpg(service.pid, signal.SIGTERM)
+            service.wait()
+
+
+if __name__ == '__main__':
+    main()
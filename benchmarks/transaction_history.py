@@ -0,0 +1,105 @@
+"""Reading one user's transaction history from transaction-service indexes.
+
+Fills transactions_db with N transactions spread over USERS users and
+compares, for one user, the old full-table scan + sort against reading the
+per-user index: the whole history newest first, and the first page that
+GET /transactions returns by default.
+
+Real rows take ~525 MB per million. With --index-only only the index and
+the measured user's rows are built, so 10M fits in memory; the scan
+baseline is skipped there.
+
+    python benchmarks/transaction_history.py [N ...] [--index-only]   # default 1000000 4000000
+"""
+import datetime
+import gc
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSACTION_SERVICE_DIR = os.path.join(ROOT, 'mnt', 'user-data', 'outputs', 'digital-wallet', 'transaction-service')
+
+USERS = 100000
+USER = 42
+
+
+def timed(call, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = call()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def run(transactions, index_only):
+    os.environ.setdefault('EVENTS_URL', '')
+    sys.path.insert(0, TRANSACTION_SERVICE_DIR)
+    import app as transaction_service
+
+    gc.disable()
+    base = datetime.datetime(2024, 1, 1)
+    db = transaction_service.transactions_db
+    for index in (db, transaction_service.transactions_by_user, transaction_service.transactions_by_wallet,
+                  transaction_service.transactions_by_user_type, transaction_service.transactions_by_wallet_type):
+        index.clear()
+
+    def row(transaction_id):
+        user_id = transaction_id % USERS
+        return {
+            'id': transaction_id, 'user_id': user_id, 'wallet_id': user_id, 'type': 'topup',
+            'amount': 1000, 'description': 'Top up', 'status': 'completed',
+            'created_at': (base + datetime.timedelta(seconds=transaction_id)).isoformat()
+        }
+
+    started = time.perf_counter()
+    if index_only:
+        for user_id in range(USERS):
+            transaction_service.transactions_by_user[user_id] = list(range(user_id or USERS, transactions + 1, USERS))
+        for transaction_id in transaction_service.transactions_by_user[USER]:
+            db[transaction_id] = row(transaction_id)
+    else:
+        for transaction_id in range(1, transactions + 1):
+            transaction = db[transaction_id] = row(transaction_id)
+            transaction_service.index_transaction(transaction)
+    build = time.perf_counter() - started
+
+    def query(limit):
+        return {'limit': limit, 'cursor': None, 'since': None, 'until': None, 'type': None}
+
+    def history(limit):
+        return transaction_service.history_page(
+            transaction_service.transactions_by_user, transaction_service.transactions_by_user_type, USER, query(limit)
+        )[0]
+
+    full_ms, rows = timed(lambda: history(transactions), 1000)
+    page_ms, _ = timed(lambda: history(transaction_service.TRANSACTIONS_PAGE_SIZE), 1000)
+    line = (f'  N={transactions:>10,} ({transactions // USERS} tx/user)  index: full {full_ms:.4f} ms,'
+            f' page {page_ms:.4f} ms')
+
+    if not index_only:
+        def scan():
+            found = [t for t in db.values() if t['user_id'] == USER]
+            found.sort(key=lambda t: (t['created_at'], t['id']), reverse=True)
+            return found
+
+        scan_ms, scanned = timed(scan, 3)
+        assert [t['id'] for t in scanned] == [t['id'] for t in rows]
+        line += f'  scan+sort {scan_ms:.1f} ms'
+    print(line + f'  (built in {build:.1f} s)')
+
+
+def main():
+    index_only = '--index-only' in sys.argv
+    sizes = [int(arg) for arg in sys.argv[1:] if arg != '--index-only'] or [1000000, 4000000]
+    print(f'One user\'s history, {USERS:,} users')
+    for transactions in sizes:
+        args = ['--run', str(transactions)] + (['--index-only'] if index_only else [])
+        subprocess.run([sys.executable, __file__] + args, check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(int(sys.argv[2]), '--index-only' in sys.argv)
+    else:
+        main()
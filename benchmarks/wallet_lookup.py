@@ -0,0 +1,62 @@
+"""Per-user wallet lookups in wallet-service with many wallets.
+
+Seeds wallets_db with N wallets (one per user) and times, through the Flask
+test client, the three routes that look a wallet up by user:
+GET /wallets/user/<id>, GET /wallets and a duplicate POST /wallets.
+The WAL and event publishing are off; user-service is answered from
+the user cache.
+
+    python benchmarks/wallet_lookup.py [wallets]    # default 1000000
+"""
+import datetime
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REQUESTS = 2000
+
+
+def main():
+    wallets = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    os.environ.setdefault('WALLET_WAL_ENABLED', 'false')
+    os.environ.setdefault('EVENTS_URL', '')
+    sys.path.insert(0, ROOT)
+    import jwt
+    import app as wallet_service
+
+    started = time.perf_counter()
+    with wallet_service.wallets_lock:
+        for user_id in range(len(wallet_service.wallets_db) + 1, wallets + 1):
+            wallet_service.wallets_by_user[user_id] = wallet_service.wallets_db.create(user_id, 1000)
+    print(f'{len(wallet_service.wallets_db)} wallets seeded in {time.perf_counter() - started:.1f} s')
+
+    # The user exists; only the wallet index is under test
+    wallet_service.user_cache.fetch = lambda user_id, token: True
+
+    user_id = wallets  # the last one, worst case for a scan
+    token = jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, wallet_service.SECRET_KEY, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+    client = wallet_service.app.test_client()
+
+    cases = [
+        ('GET /wallets/user/<id>', lambda: client.get(f'/wallets/user/{user_id}', headers=headers), 200),
+        ('GET /wallets', lambda: client.get('/wallets', headers=headers), 200),
+        ('POST /wallets duplicate', lambda: client.post('/wallets', json={}, headers=headers), 400)
+    ]
+    for name, call, status in cases:
+        for _ in range(100):
+            assert call().status_code == status
+        started = time.perf_counter()
+        for _ in range(REQUESTS):
+            call()
+        elapsed = time.perf_counter() - started
+        print(f'  {name:24} {elapsed / REQUESTS * 1e6:5.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Memory of N wallets: one dict per wallet vs the columnar WalletStore.
+
+Each layout is built in its own process and measured as the RSS delta with
+the garbage collector off. The user_id -> wallet id index that the
+wallet-service keeps next to either layout is reported separately, and
+for WalletStore the snapshot dump/load time as well.
+
+    python benchmarks/wallet_memory.py [wallets]    # default 10000000 (~3.5 GB peak for dict)
+"""
+import gc
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def run(layout, wallets):
+    sys.path.insert(0, ROOT)
+    from wallet_store import WalletStore
+
+    gc.disable()
+    base = rss()
+    started = time.perf_counter()
+    if layout == 'dict':
+        db = {}
+        for wallet_id in range(1, wallets + 1):
+            db[wallet_id] = {'id': wallet_id, 'user_id': wallet_id, 'balance': 1000000 + wallet_id,
+                             'currency': 'IDR', 'status': 'active'}
+    else:
+        db = WalletStore()
+        for wallet_id in range(1, wallets + 1):
+            db.create(wallet_id, 1000000 + wallet_id)
+    build = time.perf_counter() - started
+    store = rss() - base
+
+    wallets_by_user = {user_id: user_id for user_id in range(1, wallets + 1)}
+    index = rss() - base - store
+    print(f'  {layout:11} {store / 2**20:8.1f} MiB ({store / wallets:5.1f} B/wallet)'
+          f'  index {index / 2**20:7.1f} MiB  build {build:.1f} s')
+
+    if layout == 'walletstore':
+        started = time.perf_counter()
+        columns = db.dump()
+        dumped = time.perf_counter() - started
+        started = time.perf_counter()
+        WalletStore().load(columns)
+        print(f'  {"":11} snapshot dump {dumped:.1f} s, load {time.perf_counter() - started:.1f} s')
+    return db, wallets_by_user
+
+
+def main():
+    wallets = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    print(f'{wallets:,} wallets, RSS delta with gc disabled')
+    for layout in ('dict', 'walletstore'):
+        subprocess.run([sys.executable, __file__, '--run', layout, str(wallets)], check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -1,7 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 import requests
 import os
+import threading
+import time
+
+from config import (
+    USER_SERVICE_URL, WALLET_SERVICE_URL, TRANSACTION_SERVICE_URL, PAYMENT_SERVICE_URL,
+    SERVICES, GATEWAY_MODE,
+    UPSTREAM_POOL_SIZE, UPSTREAM_POOL_BLOCK, UPSTREAM_KEEPALIVE_TIMEOUT,
+    HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT, HEALTH_FAIL_FAST,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL,
+    PASSTHROUGH_STREAM_THRESHOLD, PASSTHROUGH_CHUNK_SIZE,
+    DASHBOARD_TIMEOUT, DASHBOARD_WORKERS, BREAKER_OPTIONS,
+    RATE_LIMIT_ENABLED, RATE_LIMIT_MAX_BUCKETS, DEFAULT_RATE_LIMITS, RATE_LIMITS,
+    EVENTS_BUFFER_SIZE, EVENTS_MAX_SUBSCRIBERS, EVENTS_MAX_PER_USER, EVENTS_HEARTBEAT, EVENTS_RETRY_MS,
+    EVENTS_TICKET_TTL, EVENTS_TICKET_MAX
+)
+from breaker import BreakerRegistry
+from cache import ResponseCache, token_user
+from dashboard import DASHBOARD_SECTIONS, build_dashboard
+from events import (
+    EventHub, SIGNATURE_HEADER, TicketStore, format_event, format_resync, parse_events, valid_signature
+)
+from health import HealthState, HealthProber
+from identity import request_principal, verified_identity, with_identity
+from pool import PoolRegistry
+from ratelimit import RateLimiter, client_key, parse_limits, retry_after_header
+from singleflight import SingleFlight
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -12,37 +39,150 @@ CORS(app, resources={
     }
 })
 
-# Service URLs
-USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://localhost:5001')
-WALLET_SERVICE_URL = os.getenv('WALLET_SERVICE_URL', 'http://localhost:5002')
-TRANSACTION_SERVICE_URL = os.getenv('TRANSACTION_SERVICE_URL', 'http://localhost:5003')
-PAYMENT_SERVICE_URL = os.getenv('PAYMENT_SERVICE_URL', 'http://localhost:5004')
+upstream_pools = PoolRegistry(
+    SERVICES,
+    pool_size=UPSTREAM_POOL_SIZE,
+    pool_block=UPSTREAM_POOL_BLOCK,
+    keepalive_timeout=UPSTREAM_KEEPALIVE_TIMEOUT
+)
+
+health_state = HealthState(SERVICES)
+health_prober = HealthProber(
+    health_state,
+    upstream_pools,
+    interval=HEALTH_CHECK_INTERVAL,
+    timeout=HEALTH_CHECK_TIMEOUT
+)
+
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+circuit_breakers = BreakerRegistry(SERVICES, **BREAKER_OPTIONS)
+
+single_flight = SingleFlight()
+
+rate_limiter = RateLimiter(
+    {**parse_limits(DEFAULT_RATE_LIMITS), **parse_limits(RATE_LIMITS)},
+    max_buckets=RATE_LIMIT_MAX_BUCKETS
+)
+
+event_hub = EventHub(
+    buffer_size=EVENTS_BUFFER_SIZE,
+    max_subscribers=EVENTS_MAX_SUBSCRIBERS,
+    max_per_user=EVENTS_MAX_PER_USER
+)
+
+event_tickets = TicketStore(ttl=EVENTS_TICKET_TTL, max_entries=EVENTS_TICKET_MAX)
+
+_workers_lock = threading.Lock()
+_workers_started = False
+
+def start_background_workers():
+    """Start the pool sweeper and health prober once (async mode runs its own)"""
+    global _workers_started
+    with _workers_lock:
+        if _workers_started:
+            return
+        upstream_pools.start_sweeper()
+        health_prober.start()
+        _workers_started = True
+
+@app.before_request
+def ensure_background_workers():
+    # Started in the serving process only: not on import, not in the reloader
+    # parent, and never when GATEWAY_MODE=async
+    if not _workers_started:
+        start_background_workers()
+
+@app.before_request
+def enforce_rate_limit():
+    """Reject /api requests over their route's token-bucket limit with 429"""
+    if not RATE_LIMIT_ENABLED or request.method == 'OPTIONS' or not request.path.startswith('/api/'):
+        return None
+    
+    route = request.endpoint
+    client = client_key(route, request.headers.get('Authorization'), request.remote_addr)
+    retry_after = rate_limiter.acquire(route, client)
+    if retry_after:
+        response = jsonify({
+            'error': 'Too many requests',
+            'message': 'Rate limit exceeded, please retry later'
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = retry_after_header(retry_after)
+        return response
+    return None
+
+# Upstream headers that describe the upstream hop rather than the payload
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+    'trailers', 'transfer-encoding', 'upgrade', 'content-length', 'content-encoding',
+    'date', 'server'
+}
+
+def passthrough_response(upstream, stream=True):
+    """Relay upstream status, headers and raw body without decoding the JSON"""
+    headers = [
+        (name, value) for name, value in upstream.headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS and not name.lower().startswith('access-control-')
+    ]
+    content_length = int(upstream.headers.get('Content-Length') or -1)
+    if not stream or 0 <= content_length <= PASSTHROUGH_STREAM_THRESHOLD:
+        return Response(upstream.content, status=upstream.status_code, headers=headers)
+    
+    def generate():
+        try:
+            yield from upstream.iter_content(chunk_size=PASSTHROUGH_CHUNK_SIZE)
+        finally:
+            upstream.close()
+    
+    return Response(generate(), status=upstream.status_code, headers=headers)
+
+def with_query(path):
+    """Append the client's query string to an upstream path"""
+    query = request.query_string.decode()
+    return f'{path}?{query}' if query else path
 
-# Request timeout in seconds
-REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 5))
+def forward_request(service_url, path, method, headers=None, data=None, stream=True):
+    """Forward request to microservice over a pooled keep-alive connection
 
-def forward_request(service_url, path, method, headers=None, json_data=None):
-    """Forward request to microservice with timeout"""
-    url = f"{service_url}{path}"
+    The request body is forwarded as raw bytes and the upstream reply is
+    relayed as-is, so JSON is never decoded and re-encoded in the gateway.
+    """
+    if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+        return jsonify({'error': 'Method not allowed'}), 405
+    
+    if HEALTH_FAIL_FAST and not health_state.is_reachable(service_url):
+        return jsonify({
+            'error': 'Service unavailable',
+            'message': 'Service is failing health checks'
+        }), 503
+    
+    breaker = circuit_breakers.get(service_url)
+    if not breaker.allow():
+        return jsonify({
+            'error': 'Service unavailable',
+            'message': 'Circuit breaker is open'
+        }), 503
     
+    headers = with_identity(headers)
+    timeout = breaker.timeout()
+    started = time.monotonic()
+    success = False
     try:
-        if method == 'GET':
-            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        elif method == 'POST':
-            response = requests.post(url, headers=headers, json=json_data, timeout=REQUEST_TIMEOUT)
-        elif method == 'PUT':
-            response = requests.put(url, headers=headers, json=json_data, timeout=REQUEST_TIMEOUT)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        pool = upstream_pools.get(service_url)
+        if method in ('POST', 'PUT'):
+            response = pool.request(method, path, headers=headers, data=data, timeout=timeout, stream=stream)
         else:
-            return jsonify({'error': 'Method not allowed'}), 405
+            response = pool.request(method, path, headers=headers, timeout=timeout, stream=stream)
         
-        return response.json(), response.status_code
+        result = passthrough_response(response, stream), response.status_code
+        success = response.status_code < 500
+        return result
     
     except requests.exceptions.Timeout:
         return jsonify({
             'error': 'Request timeout',
-            'message': f'Service did not respond within {REQUEST_TIMEOUT} seconds'
+            'message': f'Service did not respond within {timeout} seconds'
         }), 504
     
     except requests.exceptions.ConnectionError:
@@ -56,34 +196,68 @@ def forward_request(service_url, path, method, headers=None, json_data=None):
             'error': 'Service error',
             'message': str(e)
         }), 500
+    
+    finally:
+        breaker.record(success, time.monotonic() - started)
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """API Gateway health check"""
-    services_status = {}
-    
-    # Check all services
-    services = {
-        'user-service': USER_SERVICE_URL,
-        'wallet-service': WALLET_SERVICE_URL,
-        'transaction-service': TRANSACTION_SERVICE_URL,
-        'payment-service': PAYMENT_SERVICE_URL
-    }
+def forward_cached(service_url, path, headers):
+    """Forward a safe GET, serving repeats from the caller's response cache
+
+    Identical GETs that arrive while one is already in flight wait for it and
+    share its response instead of issuing their own upstream call.
+    """
+    authorization = headers.get('Authorization')
+    if not authorization:
+        return forward_request(service_url, path, 'GET', headers)
     
-    for service_name, service_url in services.items():
-        try:
-            response = requests.get(f"{service_url}/health", timeout=2)
-            services_status[service_name] = 'healthy' if response.status_code == 200 else 'unhealthy'
-        except:
-            services_status[service_name] = 'unreachable'
+    key = response_cache.key(request_principal(authorization), request.full_path)
+    if response_cache.enabled:
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, status = cached
+            return Response(body, status=status, mimetype='application/json'), status
+    
+    epoch = response_cache.epoch
     
-    all_healthy = all(status == 'healthy' for status in services_status.values())
+    def fetch():
+        body, status = forward_request(service_url, path, 'GET', headers, stream=False)
+        return body.get_data(), status, list(body.headers)
     
+    data, status, response_headers = single_flight.do(key, fetch)
+    response = Response(data, status=status, headers=response_headers)
+    if response_cache.enabled and status == 200 and response.is_json:
+        response_cache.set(key, token_user(authorization), data, status, epoch)
+    return response, status
+
+def forward_write(service_url, path, headers, data, affected_users=()):
+    """Forward a write and drop cached reads of every user it touched"""
+    body, status = forward_request(service_url, path, 'POST', headers, data)
+    authorization = headers.get('Authorization')
+    if authorization and 200 <= status < 300:
+        response_cache.invalidate_user(token_user(authorization))
+        for user_id in affected_users:
+            response_cache.invalidate_user(str(user_id))
+    return body, status
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """API Gateway health check, served from the background prober's snapshot"""
+    snapshot, ok = health_state.snapshot()
+    return jsonify(snapshot), 200 if ok else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """API Gateway runtime metrics"""
     return jsonify({
         'service': 'api-gateway',
-        'status': 'healthy' if all_healthy else 'degraded',
-        'services': services_status
-    }), 200 if all_healthy else 503
+        'pools': upstream_pools.stats(),
+        'response_cache': response_cache.stats(),
+        'breakers': circuit_breakers.stats(),
+        'single_flight': single_flight.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'events': event_hub.stats(),
+        'event_tickets': event_tickets.stats()
+    })
 
 # ==================== USER SERVICE ROUTES ====================
 
@@ -91,19 +265,25 @@ def health_check():
 def login():
     """Login endpoint"""
     headers = {'Content-Type': 'application/json'}
-    return forward_request(USER_SERVICE_URL, '/auth/login', 'POST', headers, request.get_json())
+    return forward_request(USER_SERVICE_URL, '/auth/login', 'POST', headers, request.get_data())
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     """Register endpoint"""
     headers = {'Content-Type': 'application/json'}
-    return forward_request(USER_SERVICE_URL, '/auth/register', 'POST', headers, request.get_json())
+    return forward_request(USER_SERVICE_URL, '/auth/register', 'POST', headers, request.get_data())
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    """Get all users"""
+    """Get users, paginated with ?limit=&cursor=&fields="""
+    headers = {'Authorization': request.headers.get('Authorization')}
+    return forward_request(USER_SERVICE_URL, with_query('/users'), 'GET', headers)
+
+@app.route('/api/users/batch', methods=['GET'])
+def get_users_batch():
+    """Get many users by ?ids=1,2,3"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(USER_SERVICE_URL, '/users', 'GET', headers)
+    return forward_request(USER_SERVICE_URL, with_query('/users/batch'), 'GET', headers)
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -118,7 +298,7 @@ def update_user(user_id):
         'Authorization': request.headers.get('Authorization'),
         'Content-Type': 'application/json'
     }
-    return forward_request(USER_SERVICE_URL, f'/users/{user_id}', 'PUT', headers, request.get_json())
+    return forward_request(USER_SERVICE_URL, f'/users/{user_id}', 'PUT', headers, request.get_data())
 
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
@@ -137,12 +317,12 @@ def verify_user():
 @app.route('/api/wallets', methods=['GET'])
 def get_wallets():
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(WALLET_SERVICE_URL, '/wallets', 'GET', headers)
+    return forward_cached(WALLET_SERVICE_URL, '/wallets', headers)
 
 @app.route('/api/wallets/<int:wallet_id>', methods=['GET'])
 def get_wallet(wallet_id):
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(WALLET_SERVICE_URL, f'/wallets/{wallet_id}', 'GET', headers)
+    return forward_cached(WALLET_SERVICE_URL, f'/wallets/{wallet_id}', headers)
 
 @app.route('/api/wallets/<int:wallet_id>/topup', methods=['POST'])
 def topup_wallet(wallet_id):
@@ -150,33 +330,41 @@ def topup_wallet(wallet_id):
         'Authorization': request.headers.get('Authorization'),
         'Content-Type': 'application/json'
     }
-    return forward_request(WALLET_SERVICE_URL, f'/wallets/{wallet_id}/topup', 'POST', headers, request.get_json())
+    return forward_write(WALLET_SERVICE_URL, f'/wallets/{wallet_id}/topup', headers, request.get_data())
+
+@app.route('/api/wallets/mutations/batch', methods=['POST'])
+def mutate_wallets_batch():
+    headers = {
+        'Authorization': request.headers.get('Authorization'),
+        'Content-Type': 'application/json'
+    }
+    return forward_write(WALLET_SERVICE_URL, '/wallets/mutations/batch', headers, request.get_data())
 
 # ==================== TRANSACTION SERVICE ROUTES ====================
 
 @app.route('/api/transactions', methods=['GET'])
 def get_transactions():
-    """Get all transactions"""
+    """Get transactions (limit, cursor, since, until, type are passed through)"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(TRANSACTION_SERVICE_URL, '/transactions', 'GET', headers)
+    return forward_cached(TRANSACTION_SERVICE_URL, with_query('/transactions'), headers)
 
 @app.route('/api/transactions/<int:transaction_id>', methods=['GET'])
 def get_transaction(transaction_id):
     """Get transaction by ID"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(TRANSACTION_SERVICE_URL, f'/transactions/{transaction_id}', 'GET', headers)
+    return forward_cached(TRANSACTION_SERVICE_URL, f'/transactions/{transaction_id}', headers)
 
 @app.route('/api/transactions/wallet/<int:wallet_id>', methods=['GET'])
 def get_transactions_by_wallet(wallet_id):
-    """Get transactions by wallet"""
+    """Get transactions by wallet (same query parameters as /api/transactions)"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(TRANSACTION_SERVICE_URL, f'/transactions/wallet/{wallet_id}', 'GET', headers)
+    return forward_cached(TRANSACTION_SERVICE_URL, with_query(f'/transactions/wallet/{wallet_id}'), headers)
 
 @app.route('/api/transactions/stats', methods=['GET'])
 def get_transaction_stats():
     """Get transaction statistics"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(TRANSACTION_SERVICE_URL, '/transactions/stats', 'GET', headers)
+    return forward_cached(TRANSACTION_SERVICE_URL, '/transactions/stats', headers)
 
 # ==================== PAYMENT SERVICE ROUTES ====================
 
@@ -184,13 +372,13 @@ def get_transaction_stats():
 def get_payments():
     """Get all payments"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(PAYMENT_SERVICE_URL, '/payments', 'GET', headers)
+    return forward_cached(PAYMENT_SERVICE_URL, '/payments', headers)
 
 @app.route('/api/payments/<int:payment_id>', methods=['GET'])
 def get_payment(payment_id):
     """Get payment by ID"""
     headers = {'Authorization': request.headers.get('Authorization')}
-    return forward_request(PAYMENT_SERVICE_URL, f'/payments/{payment_id}', 'GET', headers)
+    return forward_cached(PAYMENT_SERVICE_URL, f'/payments/{payment_id}', headers)
 
 @app.route('/api/payments/pay', methods=['POST'])
 def process_payment():
@@ -199,7 +387,7 @@ def process_payment():
         'Authorization': request.headers.get('Authorization'),
         'Content-Type': 'application/json'
     }
-    return forward_request(PAYMENT_SERVICE_URL, '/payments/pay', 'POST', headers, request.get_json())
+    return forward_write(PAYMENT_SERVICE_URL, '/payments/pay', headers, request.get_data())
 
 @app.route('/api/payments/transfer', methods=['POST'])
 def process_transfer():
@@ -208,7 +396,133 @@ def process_transfer():
         'Authorization': request.headers.get('Authorization'),
         'Content-Type': 'application/json'
     }
-    return forward_request(PAYMENT_SERVICE_URL, '/payments/transfer', 'POST', headers, request.get_json())
+    data = request.get_json(silent=True)
+    # The recipient's wallet and history change too
+    affected_users = [data['to_user_id']] if isinstance(data, dict) and 'to_user_id' in data else []
+    return forward_write(PAYMENT_SERVICE_URL, '/payments/transfer', headers, request.get_data(), affected_users)
+
+# ==================== DASHBOARD ROUTES ====================
+
+dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+def fetch_section(service_url, path, headers, timeout):
+    """Fetch one dashboard section, returning (status, body, error)"""
+    if HEALTH_FAIL_FAST and not health_state.is_reachable(service_url):
+        return 503, None, 'Service is failing health checks'
+    
+    breaker = circuit_breakers.get(service_url)
+    if not breaker.allow():
+        return 503, None, 'Circuit breaker is open'
+    
+    started = time.monotonic()
+    success = False
+    try:
+        response = upstream_pools.get(service_url).request(
+            'GET', path, headers=with_identity(headers), timeout=min(timeout, breaker.timeout())
+        )
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        success = response.status_code < 500
+        return response.status_code, body, None
+    except requests.exceptions.Timeout:
+        return 504, None, 'Request timeout'
+    except requests.exceptions.ConnectionError:
+        return 503, None, 'Could not connect to the service'
+    except requests.exceptions.RequestException as e:
+        return 500, None, str(e)
+    finally:
+        breaker.record(success, time.monotonic() - started)
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Wallets, recent transactions and stats fetched concurrently in one call"""
+    headers = {'Authorization': request.headers.get('Authorization')}
+    deadline = time.monotonic() + DASHBOARD_TIMEOUT
+    
+    futures = {
+        name: dashboard_executor.submit(fetch_section, service_url, path, headers, DASHBOARD_TIMEOUT)
+        for name, (service_url, path) in DASHBOARD_SECTIONS.items()
+    }
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FuturesTimeout:
+            results[name] = (504, None, 'Dashboard latency budget exceeded')
+    
+    dashboard, status = build_dashboard(results)
+    return jsonify(dashboard), status
+
+# ==================== EVENT STREAM ROUTES ====================
+
+@app.route('/internal/events', methods=['POST'])
+def publish_events():
+    """Events pushed by wallet-service and transaction-service, signed with SECRET_KEY"""
+    body = request.get_data()
+    if not valid_signature(body, request.headers.get(SIGNATURE_HEADER)):
+        return jsonify({'error': 'Invalid signature'}), 403
+    
+    events = parse_events(body)
+    if events is None:
+        return jsonify({'error': 'Invalid events'}), 400
+    
+    delivered = 0
+    for event in events:
+        delivered += event_hub.publish(event['user_id'], event['type'], event.get('data'))
+    # The change may not have gone through the gateway (e.g. payment-service -> wallet-service)
+    for user_id in {event['user_id'] for event in events}:
+        response_cache.invalidate_user(str(user_id))
+    return jsonify({'published': len(events), 'delivered': delivered})
+
+@app.route('/api/events/ticket', methods=['POST'])
+def issue_event_ticket():
+    """Trade the bearer token for a single-use ticket to open /api/events with"""
+    identity = verified_identity(request.headers.get('Authorization'))
+    if identity is None:
+        return jsonify({'error': 'Invalid token'}), 401
+    return jsonify({'ticket': event_tickets.issue(*identity), 'expires_in': EVENTS_TICKET_TTL})
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events with the caller's balance and transaction updates"""
+    # EventSource cannot set headers, so browsers pass ?ticket= instead of the token
+    authorization = request.headers.get('Authorization')
+    if authorization:
+        identity = verified_identity(authorization)
+    else:
+        identity = event_tickets.redeem(request.args.get('ticket'))
+    if identity is None:
+        return jsonify({'error': 'Invalid token or ticket'}), 401
+    user_id, exp = identity
+    
+    wake = threading.Event()
+    subscriber = event_hub.subscribe(user_id, wake.set)
+    if subscriber is None:
+        return jsonify({'error': 'Too many event streams'}), 503
+    
+    def generate():
+        yield f'retry: {EVENTS_RETRY_MS}\n\n'
+        # The stream ends when the token expires; the client needs a new token and ticket
+        while time.time() < exp:
+            woken = wake.wait(min(EVENTS_HEARTBEAT, max(exp - time.time(), 0)))
+            wake.clear()
+            events, dropped = event_hub.take(subscriber)
+            if dropped:
+                yield format_resync(dropped)
+            for event_id, event_type, data in events:
+                yield format_event(event_type, data, event_id)
+            if not woken:
+                yield ': keep-alive\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs even if the client leaves before the generator starts
+    response.call_on_close(lambda: event_hub.unsubscribe(subscriber))
+    return response
 
 # ==================== ERROR HANDLERS ====================
 
@@ -222,4 +536,8 @@ def internal_error(error):
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5050))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    if GATEWAY_MODE == 'async':
+        import async_app
+        async_app.run(port)
+    else:
+        app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,576 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+from aiohttp import web
+
+from config import (
+    USER_SERVICE_URL, WALLET_SERVICE_URL, TRANSACTION_SERVICE_URL, PAYMENT_SERVICE_URL,
+    SERVICES, ASYNC_UPSTREAM_LIMIT, UPSTREAM_KEEPALIVE_TIMEOUT,
+    HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT, HEALTH_FAIL_FAST,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, DASHBOARD_TIMEOUT, BREAKER_OPTIONS,
+    RATE_LIMIT_ENABLED, RATE_LIMIT_MAX_BUCKETS, DEFAULT_RATE_LIMITS, RATE_LIMITS,
+    EVENTS_BUFFER_SIZE, EVENTS_MAX_SUBSCRIBERS, EVENTS_MAX_PER_USER, EVENTS_HEARTBEAT, EVENTS_RETRY_MS,
+    EVENTS_TICKET_TTL, EVENTS_TICKET_MAX
+)
+from breaker import BreakerRegistry
+from cache import ResponseCache, token_user
+from dashboard import DASHBOARD_SECTIONS, build_dashboard
+from events import (
+    EventHub, SIGNATURE_HEADER, TicketStore, format_event, format_resync, parse_events, valid_signature
+)
+from health import HealthState
+from identity import request_principal, verified_identity, with_identity
+from ratelimit import RateLimiter, client_key, parse_limits, retry_after_header
+from singleflight import AsyncSingleFlight
+
+# Same route surface and error mapping as app.py, served from a single event
+# loop so that a slow upstream only costs a coroutine, not a worker thread.
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+}
+
+routes = web.RouteTableDef()
+
+
+class AsyncUpstreamPool:
+    """aiohttp session with a bounded keep-alive connector for one upstream"""
+
+    def __init__(self, name, base_url, limit, keepalive_timeout):
+        self.name = name
+        self.base_url = base_url
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.in_use = 0
+        self.requests = 0
+        self.session = None
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def request(self, method, path, timeout, **kwargs):
+        """Send a request and return (status, headers, raw body)"""
+        self.in_use += 1
+        self.requests += 1
+        try:
+            async with self.session.request(
+                method,
+                f'{self.base_url}{path}',
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                **kwargs
+            ) as response:
+                return response.status, response.headers, await response.read()
+        finally:
+            self.in_use -= 1
+
+    def stats(self):
+        return {
+            'url': self.base_url,
+            'pool_size': self.limit,
+            'in_use': self.in_use,
+            'requests': self.requests
+        }
+
+
+upstream_pools = {
+    url: AsyncUpstreamPool(name, url, ASYNC_UPSTREAM_LIMIT, UPSTREAM_KEEPALIVE_TIMEOUT)
+    for name, url in SERVICES.items()
+}
+
+health_state = HealthState(SERVICES)
+
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+circuit_breakers = BreakerRegistry(SERVICES, **BREAKER_OPTIONS)
+
+single_flight = AsyncSingleFlight()
+
+rate_limiter = RateLimiter(
+    {**parse_limits(DEFAULT_RATE_LIMITS), **parse_limits(RATE_LIMITS)},
+    max_buckets=RATE_LIMIT_MAX_BUCKETS
+)
+
+event_hub = EventHub(
+    buffer_size=EVENTS_BUFFER_SIZE,
+    max_subscribers=EVENTS_MAX_SUBSCRIBERS,
+    max_per_user=EVENTS_MAX_PER_USER
+)
+
+event_tickets = TicketStore(ttl=EVENTS_TICKET_TTL, max_entries=EVENTS_TICKET_MAX)
+
+
+# Upstream headers that describe the upstream hop rather than the payload
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+    'trailers', 'transfer-encoding', 'upgrade', 'content-length', 'content-encoding',
+    'date', 'server'
+}
+
+
+def error_response(error, message, status):
+    return web.json_response({'error': error, 'message': message}, status=status)
+
+
+def auth_headers(request, content_type=False):
+    """Build upstream headers, dropping the ones the client did not send"""
+    headers = {}
+    if request.headers.get('Authorization'):
+        headers['Authorization'] = request.headers['Authorization']
+    if content_type:
+        headers['Content-Type'] = 'application/json'
+    return headers
+
+
+def with_query(request, path):
+    """Append the client's query string to an upstream path"""
+    return f'{path}?{request.query_string}' if request.query_string else path
+
+
+def parse_json(body):
+    """Decode a JSON request body, or None if it is empty or malformed"""
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+async def forward_request(service_url, path, method, headers=None, data=None):
+    """Forward request to microservice without blocking the event loop
+
+    The request body is forwarded as raw bytes and the upstream reply is
+    relayed as-is, so JSON is never decoded and re-encoded in the gateway.
+    """
+    if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+        return web.json_response({'error': 'Method not allowed'}, status=405)
+
+    kwargs = {'headers': with_identity(headers)}
+    if method in ('POST', 'PUT'):
+        kwargs['data'] = data
+
+    if HEALTH_FAIL_FAST and not health_state.is_reachable(service_url):
+        return error_response('Service unavailable', 'Service is failing health checks', 503)
+
+    breaker = circuit_breakers.get(service_url)
+    if not breaker.allow():
+        return error_response('Service unavailable', 'Circuit breaker is open', 503)
+
+    timeout = breaker.timeout()
+    started = time.monotonic()
+    success = False
+    try:
+        status, upstream_headers, body = await upstream_pools[service_url].request(
+            method, path, timeout, **kwargs
+        )
+        success = status < 500
+        headers = {
+            name: value for name, value in upstream_headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS and not name.lower().startswith('access-control-')
+        }
+        return web.Response(body=body, status=status, headers=headers)
+
+    except asyncio.TimeoutError:
+        return error_response(
+            'Request timeout',
+            f'Service did not respond within {timeout} seconds',
+            504
+        )
+
+    except aiohttp.ClientConnectionError:
+        return error_response('Service unavailable', 'Could not connect to the service', 503)
+
+    except aiohttp.ClientError as e:
+        return error_response('Service error', str(e), 500)
+
+    finally:
+        breaker.record(success, time.monotonic() - started)
+
+
+async def forward_cached(request, service_url, path):
+    """Forward a safe GET, serving repeats from the caller's response cache
+
+    Identical GETs that arrive while one is already in flight wait for it and
+    share its response instead of issuing their own upstream call.
+    """
+    headers = auth_headers(request)
+    authorization = headers.get('Authorization')
+    if not authorization:
+        return await forward_request(service_url, path, 'GET', headers)
+
+    key = response_cache.key(request_principal(authorization), request.path_qs)
+    if response_cache.enabled:
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, status = cached
+            return web.Response(body=body, status=status, content_type='application/json')
+
+    epoch = response_cache.epoch
+
+    async def fetch():
+        response = await forward_request(service_url, path, 'GET', headers)
+        return response.body, response.status, dict(response.headers)
+
+    body, status, response_headers = await single_flight.do(key, fetch)
+    response = web.Response(body=body, status=status, headers=response_headers)
+    if response_cache.enabled and status == 200 and response.content_type == 'application/json':
+        response_cache.set(key, token_user(authorization), body, status, epoch)
+    return response
+
+
+async def forward_write(request, service_url, path, data, affected_users=()):
+    """Forward a write and drop cached reads of every user it touched"""
+    headers = auth_headers(request, content_type=True)
+    response = await forward_request(service_url, path, 'POST', headers, data)
+    authorization = headers.get('Authorization')
+    if authorization and 200 <= response.status < 300:
+        response_cache.invalidate_user(token_user(authorization))
+        for user_id in affected_users:
+            response_cache.invalidate_user(str(user_id))
+    return response
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers.update(CORS_HEADERS)
+    return response
+
+
+@web.middleware
+async def rate_limit_middleware(request, handler):
+    """Reject /api requests over their route's token-bucket limit with 429"""
+    if not RATE_LIMIT_ENABLED or request.method == 'OPTIONS' or not request.path.startswith('/api/'):
+        return await handler(request)
+
+    # Limits are keyed by view name, which matches the Flask endpoint names
+    route = request.match_info.route.handler.__name__
+    client = client_key(route, request.headers.get('Authorization'), request.remote)
+    retry_after = rate_limiter.acquire(route, client)
+    if retry_after:
+        return web.json_response(
+            {'error': 'Too many requests', 'message': 'Rate limit exceeded, please retry later'},
+            status=429,
+            headers={'Retry-After': retry_after_header(retry_after)}
+        )
+    return await handler(request)
+
+
+@web.middleware
+async def error_middleware(request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPNotFound:
+        return web.json_response({'error': 'Endpoint not found'}, status=404)
+    except web.HTTPException:
+        raise
+    except Exception:
+        return web.json_response({'error': 'Internal server error'}, status=500)
+
+
+@routes.get('/health')
+async def health_check(request):
+    """API Gateway health check, served from the background prober's snapshot"""
+    snapshot, ok = health_state.snapshot()
+    return web.json_response(snapshot, status=200 if ok else 503)
+
+
+@routes.get('/metrics')
+async def metrics(request):
+    """API Gateway runtime metrics"""
+    return web.json_response({
+        'service': 'api-gateway',
+        'mode': 'async',
+        'pools': {pool.name: pool.stats() for pool in upstream_pools.values()},
+        'response_cache': response_cache.stats(),
+        'breakers': circuit_breakers.stats(),
+        'single_flight': single_flight.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'events': event_hub.stats(),
+        'event_tickets': event_tickets.stats()
+    })
+
+# ==================== USER SERVICE ROUTES ====================
+
+@routes.post('/api/auth/login')
+async def login(request):
+    headers = {'Content-Type': 'application/json'}
+    return await forward_request(USER_SERVICE_URL, '/auth/login', 'POST', headers, await request.read())
+
+@routes.post('/api/auth/register')
+async def register(request):
+    headers = {'Content-Type': 'application/json'}
+    return await forward_request(USER_SERVICE_URL, '/auth/register', 'POST', headers, await request.read())
+
+@routes.get('/api/users')
+async def get_users(request):
+    return await forward_request(USER_SERVICE_URL, with_query(request, '/users'), 'GET', auth_headers(request))
+
+@routes.get('/api/users/batch')
+async def get_users_batch(request):
+    return await forward_request(USER_SERVICE_URL, with_query(request, '/users/batch'), 'GET', auth_headers(request))
+
+@routes.get(r'/api/users/{user_id:\d+}')
+async def get_user(request):
+    user_id = request.match_info['user_id']
+    return await forward_request(USER_SERVICE_URL, f'/users/{user_id}', 'GET', auth_headers(request))
+
+@routes.put(r'/api/users/{user_id:\d+}')
+async def update_user(request):
+    user_id = request.match_info['user_id']
+    return await forward_request(
+        USER_SERVICE_URL, f'/users/{user_id}', 'PUT',
+        auth_headers(request, content_type=True), await request.read()
+    )
+
+@routes.delete(r'/api/users/{user_id:\d+}')
+async def delete_user(request):
+    user_id = request.match_info['user_id']
+    return await forward_request(USER_SERVICE_URL, f'/users/{user_id}', 'DELETE', auth_headers(request))
+
+@routes.get('/api/users/verify')
+async def verify_user(request):
+    return await forward_request(USER_SERVICE_URL, '/users/verify', 'GET', auth_headers(request))
+
+# ==================== WALLET SERVICE ROUTES ====================
+
+@routes.get('/api/wallets')
+async def get_wallets(request):
+    return await forward_cached(request, WALLET_SERVICE_URL, '/wallets')
+
+@routes.get(r'/api/wallets/{wallet_id:\d+}')
+async def get_wallet(request):
+    wallet_id = request.match_info['wallet_id']
+    return await forward_cached(request, WALLET_SERVICE_URL, f'/wallets/{wallet_id}')
+
+@routes.post(r'/api/wallets/{wallet_id:\d+}/topup')
+async def topup_wallet(request):
+    wallet_id = request.match_info['wallet_id']
+    return await forward_write(request, WALLET_SERVICE_URL, f'/wallets/{wallet_id}/topup', await request.read())
+
+@routes.post('/api/wallets/mutations/batch')
+async def mutate_wallets_batch(request):
+    return await forward_write(request, WALLET_SERVICE_URL, '/wallets/mutations/batch', await request.read())
+
+# ==================== TRANSACTION SERVICE ROUTES ====================
+
+@routes.get('/api/transactions')
+async def get_transactions(request):
+    return await forward_cached(request, TRANSACTION_SERVICE_URL, with_query(request, '/transactions'))
+
+@routes.get(r'/api/transactions/{transaction_id:\d+}')
+async def get_transaction(request):
+    transaction_id = request.match_info['transaction_id']
+    return await forward_cached(request, TRANSACTION_SERVICE_URL, f'/transactions/{transaction_id}')
+
+@routes.get(r'/api/transactions/wallet/{wallet_id:\d+}')
+async def get_transactions_by_wallet(request):
+    wallet_id = request.match_info['wallet_id']
+    return await forward_cached(
+        request, TRANSACTION_SERVICE_URL, with_query(request, f'/transactions/wallet/{wallet_id}')
+    )
+
+@routes.get('/api/transactions/stats')
+async def get_transaction_stats(request):
+    return await forward_cached(request, TRANSACTION_SERVICE_URL, '/transactions/stats')
+
+# ==================== PAYMENT SERVICE ROUTES ====================
+
+@routes.get('/api/payments')
+async def get_payments(request):
+    return await forward_cached(request, PAYMENT_SERVICE_URL, '/payments')
+
+@routes.get(r'/api/payments/{payment_id:\d+}')
+async def get_payment(request):
+    payment_id = request.match_info['payment_id']
+    return await forward_cached(request, PAYMENT_SERVICE_URL, f'/payments/{payment_id}')
+
+@routes.post('/api/payments/pay')
+async def process_payment(request):
+    return await forward_write(request, PAYMENT_SERVICE_URL, '/payments/pay', await request.read())
+
+@routes.post('/api/payments/transfer')
+async def process_transfer(request):
+    body = await request.read()
+    data = parse_json(body)
+    # The recipient's wallet and history change too
+    affected_users = [data['to_user_id']] if isinstance(data, dict) and 'to_user_id' in data else []
+    return await forward_write(request, PAYMENT_SERVICE_URL, '/payments/transfer', body, affected_users)
+
+# ==================== DASHBOARD ROUTES ====================
+
+async def fetch_section(service_url, path, headers):
+    """Fetch one dashboard section, returning (status, body, error)"""
+    if HEALTH_FAIL_FAST and not health_state.is_reachable(service_url):
+        return 503, None, 'Service is failing health checks'
+
+    breaker = circuit_breakers.get(service_url)
+    if not breaker.allow():
+        return 503, None, 'Circuit breaker is open'
+
+    started = time.monotonic()
+    success = False
+    try:
+        status, _, body = await upstream_pools[service_url].request(
+            'GET', path, min(DASHBOARD_TIMEOUT, breaker.timeout()), headers=with_identity(headers)
+        )
+        success = status < 500
+        return status, parse_json(body), None
+    except asyncio.TimeoutError:
+        return 504, None, 'Dashboard latency budget exceeded'
+    except aiohttp.ClientConnectionError:
+        return 503, None, 'Could not connect to the service'
+    except aiohttp.ClientError as e:
+        return 500, None, str(e)
+    finally:
+        breaker.record(success, time.monotonic() - started)
+
+@routes.get('/api/dashboard')
+async def get_dashboard(request):
+    """Wallets, recent transactions and stats fetched concurrently in one call"""
+    headers = auth_headers(request)
+    results = await asyncio.gather(*(
+        fetch_section(service_url, path, headers)
+        for service_url, path in DASHBOARD_SECTIONS.values()
+    ))
+    dashboard, status = build_dashboard(dict(zip(DASHBOARD_SECTIONS.keys(), results)))
+    return web.json_response(dashboard, status=status)
+
+# ==================== EVENT STREAM ROUTES ====================
+
+@routes.post('/internal/events')
+async def publish_events(request):
+    """Events pushed by wallet-service and transaction-service, signed with SECRET_KEY"""
+    body = await request.read()
+    if not valid_signature(body, request.headers.get(SIGNATURE_HEADER)):
+        return web.json_response({'error': 'Invalid signature'}, status=403)
+
+    events = parse_events(body)
+    if events is None:
+        return web.json_response({'error': 'Invalid events'}, status=400)
+
+    delivered = 0
+    for event in events:
+        delivered += event_hub.publish(event['user_id'], event['type'], event.get('data'))
+    # The change may not have gone through the gateway (e.g. payment-service -> wallet-service)
+    for user_id in {event['user_id'] for event in events}:
+        response_cache.invalidate_user(str(user_id))
+    return web.json_response({'published': len(events), 'delivered': delivered})
+
+@routes.post('/api/events/ticket')
+async def issue_event_ticket(request):
+    """Trade the bearer token for a single-use ticket to open /api/events with"""
+    identity = verified_identity(request.headers.get('Authorization'))
+    if identity is None:
+        return web.json_response({'error': 'Invalid token'}, status=401)
+    return web.json_response({'ticket': event_tickets.issue(*identity), 'expires_in': EVENTS_TICKET_TTL})
+
+@routes.get('/api/events')
+async def stream_events(request):
+    """Server-Sent Events with the caller's balance and transaction updates"""
+    # EventSource cannot set headers, so browsers pass ?ticket= instead of the token
+    authorization = request.headers.get('Authorization')
+    if authorization:
+        identity = verified_identity(authorization)
+    else:
+        identity = event_tickets.redeem(request.query.get('ticket'))
+    if identity is None:
+        return web.json_response({'error': 'Invalid token or ticket'}, status=401)
+    user_id, exp = identity
+
+    wake = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    subscriber = event_hub.subscribe(user_id, lambda: loop.call_soon_threadsafe(wake.set))
+    if subscriber is None:
+        return web.json_response({'error': 'Too many event streams'}, status=503)
+
+    # Headers are sent by prepare(), before cors_middleware sees the response
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        **CORS_HEADERS
+    })
+    try:
+        await response.prepare(request)
+        await response.write(f'retry: {EVENTS_RETRY_MS}\n\n'.encode())
+        # The stream ends when the token expires; the client needs a new token and ticket
+        while time.time() < exp:
+            try:
+                await asyncio.wait_for(wake.wait(), min(EVENTS_HEARTBEAT, max(exp - time.time(), 0)))
+                woken = True
+            except asyncio.TimeoutError:
+                woken = False
+            wake.clear()
+            events, dropped = event_hub.take(subscriber)
+            chunks = [format_resync(dropped)] if dropped else []
+            chunks.extend(format_event(event_type, data, event_id) for event_id, event_type, data in events)
+            if not woken:
+                chunks.append(': keep-alive\n\n')
+            await response.write(''.join(chunks).encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        event_hub.unsubscribe(subscriber)
+    return response
+
+# ==================== APP SETUP ====================
+
+async def probe_upstreams():
+    """Probe all upstreams concurrently every HEALTH_CHECK_INTERVAL seconds"""
+    loop = asyncio.get_running_loop()
+
+    async def probe(name, pool):
+        started = loop.time()
+        try:
+            status, _, _ = await pool.request('GET', '/health', HEALTH_CHECK_TIMEOUT)
+            result = 'healthy' if status == 200 else 'unhealthy'
+        except Exception:
+            result = 'unreachable'
+        health_state.record(name, result, loop.time() - started)
+
+    while True:
+        started = loop.time()
+        await asyncio.gather(*(probe(pool.name, pool) for pool in upstream_pools.values()))
+        await asyncio.sleep(max(HEALTH_CHECK_INTERVAL - (loop.time() - started), 0))
+
+async def start_upstreams(app):
+    for pool in upstream_pools.values():
+        await pool.start()
+    app['health_prober'] = asyncio.create_task(probe_upstreams())
+
+async def close_upstreams(app):
+    app['health_prober'].cancel()
+    for pool in upstream_pools.values():
+        await pool.close()
+
+def create_app():
+    app = web.Application(middlewares=[cors_middleware, error_middleware, rate_limit_middleware])
+    app.add_routes(routes)
+    app.on_startup.append(start_upstreams)
+    app.on_cleanup.append(close_upstreams)
+    return app
+
+app = create_app()
+
+def run(port):
+    web.run_app(app, host='0.0.0.0', port=port)
+
+if __name__ == '__main__':
+    run(int(os.getenv('PORT', 5050)))
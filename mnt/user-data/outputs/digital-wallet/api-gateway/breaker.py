@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker with a latency-derived request timeout.
+
+    The breaker looks at the last `window` calls. It opens when, after at least
+    `min_calls`, the share of failed calls reaches `error_threshold` or the
+    share of calls slower than `slow_call_seconds` reaches `slow_threshold`.
+    After `open_seconds` a single trial call is let through (half-open); its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name, window=50, min_calls=10, error_threshold=0.5,
+                 slow_call_seconds=2.0, slow_threshold=0.5, open_seconds=10,
+                 timeout_cap=5.0, timeout_floor=0.5, timeout_percentile=99,
+                 timeout_multiplier=2.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_threshold = slow_threshold
+        self.open_seconds = open_seconds
+        self.timeout_cap = timeout_cap
+        self.timeout_floor = timeout_floor
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._outcomes = deque(maxlen=window)    # (failed, slow)
+        self._latencies = deque(maxlen=200)      # successful call latencies
+        self._timeout = timeout_cap
+        self._since_timeout_update = 0
+        self.transitions = {}
+        self.rejected = 0
+
+    def _transition(self, state):
+        key = f'{self._state}->{state}'
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def allow(self):
+        """Whether a call may be sent to the upstream right now"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def timeout(self):
+        """Current request timeout in seconds"""
+        with self._lock:
+            return self._timeout
+
+    def _update_timeout(self):
+        if len(self._latencies) < self.min_calls:
+            self._timeout = self.timeout_cap
+            return
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.timeout_percentile / 100))
+        timeout = ordered[index] * self.timeout_multiplier
+        self._timeout = round(min(max(timeout, self.timeout_floor), self.timeout_cap), 3)
+
+    def record(self, success, latency):
+        """Record the outcome of a call that allow() let through"""
+        with self._lock:
+            slow = latency >= self.slow_call_seconds
+            if success:
+                self._latencies.append(latency)
+                self._since_timeout_update += 1
+                if self._since_timeout_update >= 10:
+                    self._since_timeout_update = 0
+                    self._update_timeout()
+
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                self._transition(CLOSED if success and not slow else OPEN)
+                return
+
+            self._outcomes.append((not success, slow))
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                calls = len(self._outcomes)
+                error_rate = sum(1 for failed, _ in self._outcomes if failed) / calls
+                slow_rate = sum(1 for _, is_slow in self._outcomes if is_slow) / calls
+                if error_rate >= self.error_threshold or slow_rate >= self.slow_threshold:
+                    self._transition(OPEN)
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'state': self._state,
+                'calls': calls,
+                'error_rate': round(sum(1 for failed, _ in self._outcomes if failed) / calls, 4) if calls else 0.0,
+                'slow_rate': round(sum(1 for _, slow in self._outcomes if slow) / calls, 4) if calls else 0.0,
+                'timeout': self._timeout,
+                'rejected': self.rejected,
+                'transitions': dict(self.transitions)
+            }
+
+
+class BreakerRegistry:
+    """Circuit breakers keyed by service URL"""
+
+    def __init__(self, services, **options):
+        self.breakers = {url: CircuitBreaker(name, **options) for name, url in services.items()}
+
+    def get(self, service_url):
+        return self.breakers[service_url]
+
+    def stats(self):
+        return {breaker.name: breaker.stats() for breaker in self.breakers.values()}
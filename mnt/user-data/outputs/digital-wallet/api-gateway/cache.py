@@ -0,0 +1,103 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+def token_digest(authorization):
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def token_user(authorization):
+    """User id claimed by the bearer token, or its digest if it has none.
+
+    The claim is read without verifying the signature, so it is only used to
+    group entries for invalidation; lookups are always keyed by the token itself.
+    """
+    token = authorization[7:] if authorization.startswith('Bearer ') else authorization
+    try:
+        claims = jwt.decode(token, options={'verify_signature': False})
+        return str(claims['user_id'])
+    except (jwt.InvalidTokenError, KeyError, TypeError):
+        return token_digest(authorization)
+
+
+class ResponseCache:
+    """Bounded LRU cache of upstream GET responses with a per-entry TTL"""
+
+    def __init__(self, max_entries=10000, ttl=10):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (user, expires_at, body, status)
+        self._user_keys = {}           # user -> set of keys
+        # Bumped on every invalidation so that a read which raced a write
+        # does not store the pre-write response
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def key(self, principal, path):
+        return (principal, path)
+
+    def _remove(self, key):
+        user = self._entries.pop(key)[0]
+        keys = self._user_keys.get(user)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user]
+
+    def get(self, key):
+        """Return (body, status) for a fresh entry, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def set(self, key, user, body, status, epoch):
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (user, time.monotonic() + self.ttl, body, status)
+            self._user_keys.setdefault(user, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user):
+        with self._lock:
+            self.epoch += 1
+            for key in self._user_keys.pop(user, ()):
+                self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
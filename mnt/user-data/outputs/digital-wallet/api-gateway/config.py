@@ -0,0 +1,101 @@
+import os
+
+# Service URLs
+USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://localhost:5001')
+WALLET_SERVICE_URL = os.getenv('WALLET_SERVICE_URL', 'http://localhost:5002')
+TRANSACTION_SERVICE_URL = os.getenv('TRANSACTION_SERVICE_URL', 'http://localhost:5003')
+PAYMENT_SERVICE_URL = os.getenv('PAYMENT_SERVICE_URL', 'http://localhost:5004')
+
+SERVICES = {
+    'user-service': USER_SERVICE_URL,
+    'wallet-service': WALLET_SERVICE_URL,
+    'transaction-service': TRANSACTION_SERVICE_URL,
+    'payment-service': PAYMENT_SERVICE_URL
+}
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'digital-wallet-secret-key-2024')
+
+# When set, the gateway verifies each JWT once and forwards a signed
+# X-User-Identity header that services sharing this key trust instead
+INTERNAL_IDENTITY_KEY = os.getenv('INTERNAL_IDENTITY_KEY', '')
+
+# Request timeout in seconds. With adaptive timeouts this is the upper bound.
+REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 5))
+
+# Serving mode: 'sync' (Flask) or 'async' (aiohttp)
+GATEWAY_MODE = os.getenv('GATEWAY_MODE', 'sync').lower()
+
+# Upstream connection pooling
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 20))
+UPSTREAM_POOL_BLOCK = os.getenv('UPSTREAM_POOL_BLOCK', 'false').lower() == 'true'
+UPSTREAM_KEEPALIVE_TIMEOUT = int(os.getenv('UPSTREAM_KEEPALIVE_TIMEOUT', 60))
+
+# Max concurrent upstream connections per service in async mode
+ASYNC_UPSTREAM_LIMIT = int(os.getenv('ASYNC_UPSTREAM_LIMIT', 1000))
+
+# Background health probing
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 5))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))
+# Reject requests to services the prober marked unreachable instead of waiting on them
+HEALTH_FAIL_FAST = os.getenv('HEALTH_FAIL_FAST', 'false').lower() == 'true'
+
+# Per-user response cache for safe GET routes (0 disables)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 10000))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 10))
+
+# Upstream responses larger than this are streamed to the client in chunks
+# instead of being buffered in the gateway
+PASSTHROUGH_STREAM_THRESHOLD = int(os.getenv('PASSTHROUGH_STREAM_THRESHOLD', 256 * 1024))
+PASSTHROUGH_CHUNK_SIZE = int(os.getenv('PASSTHROUGH_CHUNK_SIZE', 64 * 1024))
+
+# Composite /api/dashboard endpoint
+DASHBOARD_TIMEOUT = float(os.getenv('DASHBOARD_TIMEOUT', 2))
+DASHBOARD_TRANSACTIONS_LIMIT = int(os.getenv('DASHBOARD_TRANSACTIONS_LIMIT', 10))
+DASHBOARD_WORKERS = int(os.getenv('DASHBOARD_WORKERS', 32))
+
+# Per-upstream circuit breakers
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', 50))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', 10))
+BREAKER_ERROR_THRESHOLD = float(os.getenv('BREAKER_ERROR_THRESHOLD', 0.5))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', 2))
+BREAKER_SLOW_THRESHOLD = float(os.getenv('BREAKER_SLOW_THRESHOLD', 0.5))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', 10))
+
+# Adaptive timeouts: observed latency percentile x multiplier, clamped to [min, REQUEST_TIMEOUT]
+ADAPTIVE_TIMEOUT_PERCENTILE = float(os.getenv('ADAPTIVE_TIMEOUT_PERCENTILE', 99))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv('ADAPTIVE_TIMEOUT_MULTIPLIER', 2))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv('ADAPTIVE_TIMEOUT_MIN', 0.5))
+
+BREAKER_OPTIONS = {
+    'window': BREAKER_WINDOW,
+    'min_calls': BREAKER_MIN_CALLS,
+    'error_threshold': BREAKER_ERROR_THRESHOLD,
+    'slow_call_seconds': BREAKER_SLOW_CALL_SECONDS,
+    'slow_threshold': BREAKER_SLOW_THRESHOLD,
+    'open_seconds': BREAKER_OPEN_SECONDS,
+    'timeout_cap': REQUEST_TIMEOUT,
+    'timeout_floor': ADAPTIVE_TIMEOUT_MIN,
+    'timeout_percentile': ADAPTIVE_TIMEOUT_PERCENTILE,
+    'timeout_multiplier': ADAPTIVE_TIMEOUT_MULTIPLIER
+}
+
+# Token-bucket rate limits per route (view function name) as 'route=rate:burst',
+# where rate is tokens per second. RATE_LIMITS entries override the defaults.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv('RATE_LIMIT_MAX_BUCKETS', 100000))
+DEFAULT_RATE_LIMITS = 'default=20:40,login=0.5:5,register=0.2:3,process_payment=2:5,process_transfer=2:5'
+RATE_LIMITS = os.getenv('RATE_LIMITS', '')
+
+# Server-Sent Events at /api/events: per-stream buffer of undelivered events,
+# subscriber caps, keep-alive interval and client reconnect delay.
+# Tickets, open streams and the cache invalidation done by POST /internal/events
+# live in this process only, so the gateway must run as a single worker process
+# (threads in sync mode, one event loop in async mode); see README.
+EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', 64))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 10000))
+EVENTS_MAX_PER_USER = int(os.getenv('EVENTS_MAX_PER_USER', 10))
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 3000))
+# Single-use ticket for ?ticket= on /api/events, instead of the JWT in the URL
+EVENTS_TICKET_TTL = float(os.getenv('EVENTS_TICKET_TTL', 30))
+EVENTS_TICKET_MAX = int(os.getenv('EVENTS_TICKET_MAX', 10000))
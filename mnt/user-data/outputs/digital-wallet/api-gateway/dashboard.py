@@ -0,0 +1,46 @@
+from config import WALLET_SERVICE_URL, TRANSACTION_SERVICE_URL, DASHBOARD_TRANSACTIONS_LIMIT
+
+# section name -> (service URL, upstream path)
+DASHBOARD_SECTIONS = {
+    'wallets': (WALLET_SERVICE_URL, '/wallets'),
+    'transactions': (TRANSACTION_SERVICE_URL, f'/transactions?limit={DASHBOARD_TRANSACTIONS_LIMIT}'),
+    'stats': (TRANSACTION_SERVICE_URL, '/transactions/stats')
+}
+
+
+def section_data(name, body):
+    """Pick the part of an upstream reply that goes into the dashboard"""
+    if name == 'wallets':
+        return body['wallets']
+    if name == 'transactions':
+        return body['transactions'][:DASHBOARD_TRANSACTIONS_LIMIT]
+    return body
+
+
+def build_dashboard(results):
+    """Merge per-section results into one document.
+
+    results maps section name to (status, body, error). Failed sections are
+    reported under 'errors' instead of failing the whole dashboard; only when
+    every section failed is the first failure's status returned.
+    """
+    dashboard = {}
+    errors = {}
+    for name in DASHBOARD_SECTIONS:
+        status, body, error = results[name]
+        if status == 200 and body is not None:
+            try:
+                dashboard[name] = section_data(name, body)
+                continue
+            except (KeyError, TypeError):
+                error = 'Unexpected response from service'
+                status = 502
+        dashboard[name] = None
+        if error is None and isinstance(body, dict):
+            error = body.get('error')
+        errors[name] = {'status': status, 'error': error or 'Service error'}
+
+    dashboard['errors'] = errors
+    if len(errors) == len(DASHBOARD_SECTIONS):
+        return dashboard, next(iter(errors.values()))['status']
+    return dashboard, 200
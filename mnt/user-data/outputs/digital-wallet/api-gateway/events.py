@@ -0,0 +1,189 @@
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import SECRET_KEY
+
+# Services sign the raw body of POST /internal/events (see common/events.py)
+SIGNATURE_HEADER = 'X-Event-Signature'
+
+
+class Subscriber:
+    """One open event stream: a bounded buffer plus a wake-up callback"""
+
+    __slots__ = ('user_id', 'events', 'dropped', 'wake')
+
+    def __init__(self, user_id, buffer_size, wake):
+        self.user_id = user_id
+        self.events = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.wake = wake
+
+
+class EventHub:
+    """Fan out per-user events to the open streams of that user.
+
+    Each stream keeps at most buffer_size undelivered events; when a slow
+    client falls behind, the oldest are dropped and the stream is told to
+    resync instead. An idle stream costs its Subscriber and a waiting
+    thread (sync) or coroutine (async), nothing per event of other users.
+    """
+
+    def __init__(self, buffer_size=64, max_subscribers=10000, max_per_user=10):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of Subscriber
+        self._count = 0
+        self._next_id = 1
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def subscribe(self, user_id, wake):
+        """Register a stream, or return None when the subscriber limits are reached"""
+        with self._lock:
+            streams = self._subscribers.get(user_id, ())
+            if self._count >= self.max_subscribers or len(streams) >= self.max_per_user:
+                self.rejected += 1
+                return None
+            subscriber = Subscriber(user_id, self.buffer_size, wake)
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            self._count += 1
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            streams = self._subscribers.get(subscriber.user_id)
+            if streams is None or subscriber not in streams:
+                return
+            streams.discard(subscriber)
+            if not streams:
+                del self._subscribers[subscriber.user_id]
+            self._count -= 1
+
+    def publish(self, user_id, event_type, data):
+        """Queue an event for every stream of user_id; returns how many got it"""
+        with self._lock:
+            event = (self._next_id, event_type, data)
+            self._next_id += 1
+            self.published += 1
+            streams = list(self._subscribers.get(user_id, ()))
+            for subscriber in streams:
+                if len(subscriber.events) == self.buffer_size:
+                    subscriber.dropped += 1
+                    self.dropped += 1
+                subscriber.events.append(event)
+            self.delivered += len(streams)
+        for subscriber in streams:
+            subscriber.wake()
+        return len(streams)
+
+    def take(self, subscriber):
+        """Return (buffered events, number dropped since the last take)"""
+        with self._lock:
+            events = list(subscriber.events)
+            subscriber.events.clear()
+            dropped, subscriber.dropped = subscriber.dropped, 0
+        return events, dropped
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'users': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'rejected': self.rejected
+            }
+
+
+class TicketStore:
+    """Short-lived, single-use tickets for opening an event stream.
+
+    EventSource cannot send an Authorization header, so the client trades
+    its token for a ticket (POST /api/events/ticket) and puts that in the
+    URL instead. A ticket that ends up in an access log is useless: it
+    expires after ttl seconds and is removed when the stream is opened.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._tickets = OrderedDict()  # ticket -> (user_id, token exp, expires_at)
+        self.issued = 0
+        self.redeemed = 0
+        self.rejected = 0
+
+    def issue(self, user_id, exp):
+        ticket = secrets.token_urlsafe(32)
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._tickets[ticket] = (user_id, exp, min(now + self.ttl, exp))
+            if len(self._tickets) > self.max_entries:
+                self._tickets.popitem(last=False)
+            self.issued += 1
+        return ticket
+
+    def redeem(self, ticket):
+        """Return (user_id, token exp) and invalidate the ticket, or None"""
+        with self._lock:
+            entry = self._tickets.pop(ticket, None) if ticket else None
+            if entry is None or entry[2] <= time.time():
+                self.rejected += 1
+                return None
+            self.redeemed += 1
+            return entry[0], entry[1]
+
+    def _purge(self, now):
+        while self._tickets and next(iter(self._tickets.values()))[2] <= now:
+            self._tickets.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tickets': len(self._tickets),
+                'issued': self.issued,
+                'redeemed': self.redeemed,
+                'rejected': self.rejected
+            }
+
+
+def format_event(event_type, data, event_id=None):
+    """Encode one event in text/event-stream format"""
+    payload = json.dumps(data, separators=(',', ':'))
+    prefix = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{prefix}event: {event_type}\ndata: {payload}\n\n'
+
+
+def format_resync(dropped):
+    """Tell a client that fell behind to refetch its state"""
+    return format_event('resync', {'dropped': dropped})
+
+
+def valid_signature(body, signature):
+    expected = hmac.new(SECRET_KEY.encode(), body, hashlib.sha256).hexdigest()
+    return bool(signature) and hmac.compare_digest(signature, expected)
+
+
+def parse_events(body):
+    """Events from a publish request body, or None if it is malformed"""
+    try:
+        events = json.loads(body)['events']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(events, list):
+        return None
+    if not all(isinstance(e, dict) and isinstance(e.get('user_id'), int) and isinstance(e.get('type'), str)
+               for e in events):
+        return None
+    return events
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HealthState:
+    """Latest health probe result for every upstream service"""
+
+    def __init__(self, services):
+        self.services = dict(services)
+        self._names = {url: name for name, url in self.services.items()}
+        self._lock = threading.Lock()
+        self._checks = {
+            name: {'status': 'unknown', 'latency': None, 'checked_at': None, 'last_success': None}
+            for name in self.services
+        }
+
+    def record(self, name, status, latency):
+        now = time.monotonic()
+        with self._lock:
+            check = self._checks[name]
+            check['status'] = status
+            check['latency'] = latency
+            check['checked_at'] = now
+            if status == 'healthy':
+                check['last_success'] = now
+
+    def status(self, service_url):
+        """Last known status of the service behind service_url"""
+        with self._lock:
+            return self._checks[self._names[service_url]]['status']
+
+    def is_reachable(self, service_url):
+        return self.status(service_url) != 'unreachable'
+
+    def snapshot(self):
+        now = time.monotonic()
+
+        def age(moment):
+            return None if moment is None else round(now - moment, 3)
+
+        with self._lock:
+            services_status = {name: check['status'] for name, check in self._checks.items()}
+            checks = {
+                name: {
+                    'status': check['status'],
+                    'latency_ms': None if check['latency'] is None else round(check['latency'] * 1000, 1),
+                    'checked_age': age(check['checked_at']),
+                    'last_success_age': age(check['last_success'])
+                }
+                for name, check in self._checks.items()
+            }
+        # 'unknown' = not probed yet (just started); it is not a failure
+        failing = any(status not in ('healthy', 'unknown') for status in services_status.values())
+        if failing:
+            overall = 'degraded'
+        elif any(status == 'unknown' for status in services_status.values()):
+            overall = 'starting'
+        else:
+            overall = 'healthy'
+        return {
+            'service': 'api-gateway',
+            'status': overall,
+            'services': services_status,
+            'checks': checks
+        }, not failing
+
+
+class HealthProber:
+    """Background thread that probes all upstreams concurrently on an interval"""
+
+    def __init__(self, state, pools, interval=5, timeout=2):
+        self.state = state
+        self.pools = pools
+        self.interval = interval
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=len(state.services), thread_name_prefix='health-probe')
+        self._thread = None
+
+    def probe(self, name, service_url):
+        started = time.monotonic()
+        try:
+            response = self.pools.get(service_url).request('GET', '/health', timeout=self.timeout)
+            status = 'healthy' if response.status_code == 200 else 'unhealthy'
+        except Exception:
+            status = 'unreachable'
+        self.state.record(name, status, time.monotonic() - started)
+
+    def probe_all(self):
+        futures = [
+            self._executor.submit(self.probe, name, url)
+            for name, url in self.state.services.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                started = time.monotonic()
+                self.probe_all()
+                time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+        self._thread = threading.Thread(target=run, name='health-prober', daemon=True)
+        self._thread.start()
@@ -0,0 +1,84 @@
+import contextvars
+import hashlib
+import hmac
+import time
+
+import jwt
+
+from cache import token_digest
+from config import SECRET_KEY, INTERNAL_IDENTITY_KEY
+
+IDENTITY_HEADER = 'X-User-Identity'
+
+# (authorization, identity) of the last token verified in this request
+_verified = contextvars.ContextVar('verified_identity', default=(None, None))
+
+
+def sign_identity(user_id, exp):
+    """Identity header value: '<user_id>.<exp>.<hmac>' signed with the internal key"""
+    payload = f'{user_id}.{exp}'
+    signature = hmac.new(INTERNAL_IDENTITY_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return f'{payload}.{signature}'
+
+
+def verify_token(authorization):
+    """Return (user_id, exp) for a valid bearer token, or None"""
+    token = authorization[7:] if authorization.startswith('Bearer ') else authorization
+    try:
+        data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        return int(data['user_id']), int(data['exp'])
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+        return None
+
+
+def verified_identity(authorization):
+    """verify_token() done once per request.
+
+    The rate limiter, the cache key and the identity header all need the
+    verified user. The result is kept in a context variable, which is per
+    thread in the sync gateway and per task in the async one; it is keyed by
+    the header, so a stale entry from an earlier request is never reused for
+    another token.
+    """
+    if not authorization:
+        return None
+    cached, identity = _verified.get()
+    if cached != authorization:
+        identity = verify_token(authorization)
+        _verified.set((authorization, identity))
+    elif identity is not None and identity[1] <= time.time():
+        identity = None
+    return identity
+
+
+def request_principal(authorization):
+    """Who a GET is answered for, used to share cached and in-flight responses.
+
+    In identity mode the gateway trusts its own JWT verification, so all of a
+    user's tokens (one per device) share a principal. Otherwise each token is
+    its own principal.
+    """
+    if INTERNAL_IDENTITY_KEY:
+        identity = verified_identity(authorization)
+        if identity is not None:
+            return f'user:{identity[0]}'
+    return token_digest(authorization)
+
+
+def with_identity(headers):
+    """Add a signed identity header when the bearer token verifies.
+
+    Services that share INTERNAL_IDENTITY_KEY accept the header instead of
+    decoding the JWT again. Invalid or expired tokens are forwarded untouched
+    so the service still answers with its usual 401.
+    """
+    if not INTERNAL_IDENTITY_KEY or not headers:
+        return headers
+    authorization = headers.get('Authorization')
+    if not authorization:
+        return headers
+
+    identity = verified_identity(authorization)
+    if identity is None:
+        return headers
+    return {**headers, IDENTITY_HEADER: sign_identity(*identity)}
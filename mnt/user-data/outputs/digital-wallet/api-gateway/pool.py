@@ -0,0 +1,126 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class UpstreamPool:
+    """Keep-alive connection pool for a single upstream service"""
+
+    def __init__(self, name, base_url, pool_size=10, pool_block=False, keepalive_timeout=60):
+        self.name = name
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.pool_block = pool_block
+        self.keepalive_timeout = keepalive_timeout
+
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._last_used = time.monotonic()
+        # Counters carried over from sessions that were evicted
+        self._retired_created = 0
+        self._retired_requests = 0
+        self._evictions = 0
+        self._session = self._new_session()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=self.pool_block,
+            max_retries=0
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _connection_counters(self, session):
+        """Return (connections created, requests sent) for a session"""
+        created = sent = 0
+        manager = session.get_adapter(self.base_url).poolmanager
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            created += pool.num_connections
+            sent += pool.num_requests
+        return created, sent
+
+    def request(self, method, path, **kwargs):
+        """Send a request to the upstream over a pooled connection"""
+        with self._lock:
+            self._in_use += 1
+            self._last_used = time.monotonic()
+            session = self._session
+        try:
+            return session.request(method, f'{self.base_url}{path}', **kwargs)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+
+    def evict_idle(self):
+        """Close all pooled connections if the upstream has been idle too long"""
+        with self._lock:
+            idle = time.monotonic() - self._last_used
+            if self._in_use or idle < self.keepalive_timeout:
+                return False
+            created, sent = self._connection_counters(self._session)
+            if not created:
+                return False
+            old_session = self._session
+            self._retired_created += created
+            self._retired_requests += sent
+            self._evictions += 1
+            self._session = self._new_session()
+        old_session.close()
+        return True
+
+    def stats(self):
+        with self._lock:
+            created, sent = self._connection_counters(self._session)
+            created += self._retired_created
+            sent += self._retired_requests
+            return {
+                'url': self.base_url,
+                'pool_size': self.pool_size,
+                'in_use': self._in_use,
+                'created': created,
+                'reused': max(sent - created, 0),
+                'evictions': self._evictions,
+                'idle_seconds': round(time.monotonic() - self._last_used, 3)
+            }
+
+
+class PoolRegistry:
+    """Upstream pools keyed by service URL, with a background idle sweeper"""
+
+    def __init__(self, services, pool_size=10, pool_block=False, keepalive_timeout=60):
+        self.pools = {
+            url: UpstreamPool(name, url, pool_size, pool_block, keepalive_timeout)
+            for name, url in services.items()
+        }
+        self.keepalive_timeout = keepalive_timeout
+        self._sweeper = None
+
+    def get(self, service_url):
+        return self.pools[service_url]
+
+    def start_sweeper(self):
+        if self._sweeper is not None or self.keepalive_timeout <= 0:
+            return
+        interval = max(self.keepalive_timeout / 2, 1)
+
+        def sweep():
+            while True:
+                time.sleep(interval)
+                for pool in self.pools.values():
+                    pool.evict_idle()
+
+        self._sweeper = threading.Thread(target=sweep, name='upstream-pool-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        return {pool.name: pool.stats() for pool in self.pools.values()}
@@ -0,0 +1,102 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from identity import verified_identity
+
+# Called before the client has a token, so limited per client IP
+IP_KEYED_ROUTES = {'login', 'register'}
+
+
+def parse_limits(spec):
+    """Parse 'route=rate:burst,...' into {route: (rate, burst)}"""
+    limits = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        route, _, value = item.partition('=')
+        rate, _, burst = value.partition(':')
+        limits[route.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+def client_key(route, authorization, remote_addr):
+    """Bucket owner: the verified user, or the client IP.
+
+    Tokens that do not verify fall back to the IP, so made-up tokens neither
+    get a fresh bucket each nor push real users out of the LRU.
+    """
+    if route in IP_KEYED_ROUTES or not authorization:
+        return f'ip:{remote_addr}'
+    identity = verified_identity(authorization)
+    if identity is None:
+        return f'ip:{remote_addr}'
+    return f'user:{identity[0]}'
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(min(seconds, 3600))))
+
+
+class RateLimiter:
+    """Token-bucket rate limiter keyed by (route, client).
+
+    Buckets are refilled lazily when they are touched, so there is no timer.
+    They live in an LRU map capped at max_buckets. A bucket idle long enough to
+    refill completely is the same as a fresh one, so evicting the least
+    recently used buckets rarely forgets one that is still draining.
+    """
+
+    def __init__(self, limits, max_buckets=100000):
+        self.limits = dict(limits)
+        self.default = self.limits.pop('default', None)
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # (route, client) -> [tokens, updated_at]
+        self.allowed = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def limit_for(self, route):
+        return self.limits.get(route, self.default)
+
+    def acquire(self, route, client):
+        """Take one token; return 0 if allowed, else seconds until one is available"""
+        limit = self.limit_for(route)
+        if limit is None:
+            return 0
+        rate, burst = limit
+        key = (route, client)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return 0
+
+            self.rejected += 1
+            return (1 - bucket[0]) / rate if rate > 0 else math.inf
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buckets': len(self._buckets),
+                'max_buckets': self.max_buckets,
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+                'evictions': self.evictions
+            }
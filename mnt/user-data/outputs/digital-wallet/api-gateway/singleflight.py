@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one upstream call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        total = self.executed + self.coalesced
+        return {
+            'in_flight': in_flight,
+            'upstream_calls': self.executed,
+            'coalesced': self.coalesced,
+            'saved_ratio': round(self.coalesced / total, 4) if total else 0.0
+        }
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the async gateway"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # Run as its own task so a disconnecting first caller does not
+            # cancel the upstream call the others are waiting on
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.executed += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        total = self.executed + self.coalesced
+        return {
+            'in_flight': len(self._calls),
+            'upstream_calls': self.executed,
+            'coalesced': self.coalesced,
+            'saved_ratio': round(self.coalesced / total, 4) if total else 0.0
+        }
@@ -0,0 +1,214 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import jwt
+from flask import request, jsonify
+
+# Identity header signed by the api-gateway (see INTERNAL_IDENTITY_KEY)
+IDENTITY_HEADER = 'X-User-Identity'
+
+# Service-to-service calls that act for no particular user, signed with SECRET_KEY
+INTERNAL_SIGNATURE_HEADER = 'X-Internal-Signature'
+INTERNAL_TIMESTAMP_HEADER = 'X-Internal-Timestamp'
+INTERNAL_MAX_SKEW = 300
+
+
+def identity_header():
+    """Pass the caller's identity header on to internal service calls"""
+    value = request.headers.get(IDENTITY_HEADER)
+    return {IDENTITY_HEADER: value} if value else {}
+
+
+def internal_signature(secret_key, timestamp, method, path, body):
+    """HMAC-SHA256 over '<timestamp>.<METHOD>.<path>.' followed by the raw body"""
+    message = f'{timestamp}.{method.upper()}.{path}.'.encode() + body
+    return hmac.new(secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+
+def internal_headers(secret_key, method, path, body=b''):
+    """Headers that authenticate an internal request to another service"""
+    timestamp = int(time.time())
+    return {
+        INTERNAL_TIMESTAMP_HEADER: str(timestamp),
+        INTERNAL_SIGNATURE_HEADER: internal_signature(secret_key, timestamp, method, path, body)
+    }
+
+
+class TokenVerifier:
+    """JWT verification shared by the services, with an LRU of verified claims.
+
+    Verified tokens are cached by SHA-256 digest together with their user id
+    and `exp`, so a token seen again skips jwt.decode until it expires. Only
+    valid tokens are cached; invalid ones are decoded every time and keep
+    their usual error. `required` is the `token_required` decorator.
+
+    `internal` accepts only requests signed with internal_headers(), and
+    `required_or_internal` accepts either, passing current_user_id=None for
+    a signed service call. A signature is valid for INTERNAL_MAX_SKEW seconds
+    and only once.
+    """
+
+    def __init__(self, secret_key, identity_key='', max_entries=10000,
+                 missing_message='Token is missing', expired_message='Token has expired',
+                 invalid_message='Invalid token'):
+        self.secret_key = secret_key
+        self.identity_key = identity_key
+        self.max_entries = max_entries
+        self.missing_message = missing_message
+        self.expired_message = expired_message
+        self.invalid_message = invalid_message
+        self._lock = threading.Lock()
+        self._claims = OrderedDict()  # digest -> (user_id, exp)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.identity_hits = 0
+        self._signatures = OrderedDict()  # signature -> expires_at, against replays
+        self.internal_calls = 0
+
+    def identity_from_gateway(self):
+        """User id from a valid gateway-signed identity header, or None"""
+        if not self.identity_key:
+            return None
+
+        value = request.headers.get(IDENTITY_HEADER)
+        if not value:
+            return None
+
+        try:
+            user_id, exp, signature = value.split('.')
+            expected = hmac.new(
+                self.identity_key.encode(), f'{user_id}.{exp}'.encode(), hashlib.sha256
+            ).hexdigest()
+            if not hmac.compare_digest(signature, expected) or int(exp) < time.time():
+                return None
+            return int(user_id)
+        except ValueError:
+            return None
+
+    def internal_caller(self):
+        """True when the request carries a fresh, unused internal signature"""
+        signature = request.headers.get(INTERNAL_SIGNATURE_HEADER)
+        try:
+            timestamp = int(request.headers.get(INTERNAL_TIMESTAMP_HEADER, ''))
+        except ValueError:
+            return False
+        now = time.time()
+        if not signature or abs(now - timestamp) > INTERNAL_MAX_SKEW:
+            return False
+
+        expected = internal_signature(self.secret_key, timestamp, request.method, request.path,
+                                      request.get_data())
+        if not hmac.compare_digest(signature, expected):
+            return False
+
+        with self._lock:
+            while self._signatures and next(iter(self._signatures.values())) < now:
+                self._signatures.popitem(last=False)
+            if signature in self._signatures:
+                return False
+            self._signatures[signature] = timestamp + INTERNAL_MAX_SKEW
+            self.internal_calls += 1
+        return True
+
+    def _cached(self, digest):
+        with self._lock:
+            entry = self._claims.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_id, exp = entry
+            # Same rule as jwt.decode: expired once exp <= now
+            if exp is not None and exp <= time.time():
+                del self._claims[digest]
+                self.misses += 1
+                return None
+            self._claims.move_to_end(digest)
+            self.hits += 1
+            return user_id
+
+    def _store(self, digest, user_id, exp):
+        with self._lock:
+            self._claims[digest] = (user_id, exp)
+            self._claims.move_to_end(digest)
+            if len(self._claims) > self.max_entries:
+                self._claims.popitem(last=False)
+                self.evictions += 1
+
+    def verify(self, authorization):
+        """Return (user_id, None) for a valid token, else (None, error message)"""
+        if not authorization:
+            return None, self.missing_message
+
+        token = authorization[7:] if authorization.startswith('Bearer ') else authorization
+        digest = hashlib.sha256(token.encode()).digest()
+        user_id = self._cached(digest)
+        if user_id is not None:
+            return user_id, None
+
+        try:
+            data = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+            user_id = data['user_id']
+        except jwt.ExpiredSignatureError:
+            return None, self.expired_message
+        except (jwt.InvalidTokenError, KeyError, TypeError):
+            return None, self.invalid_message
+
+        if self.max_entries > 0:
+            self._store(digest, user_id, data.get('exp'))
+        return user_id, None
+
+    def required(self, f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            current_user_id = self.identity_from_gateway()
+            if current_user_id is not None:
+                self.identity_hits += 1
+                return f(current_user_id, *args, **kwargs)
+
+            current_user_id, error = self.verify(request.headers.get('Authorization'))
+            if error:
+                return jsonify({'error': error}), 401
+
+            return f(current_user_id, *args, **kwargs)
+
+        return decorated
+
+    def internal(self, f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not self.internal_caller():
+                return jsonify({'error': 'Internal credential required'}), 403
+            return f(*args, **kwargs)
+
+        return decorated
+
+    def required_or_internal(self, f):
+        user_route = self.required(f)
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if self.internal_caller():
+                return f(None, *args, **kwargs)
+            return user_route(*args, **kwargs)
+
+        return decorated
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._claims)
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'identity_hits': self.identity_hits,
+            'internal_calls': self.internal_calls
+        }
@@ -0,0 +1,93 @@
+import hashlib
+import hmac
+import json
+import threading
+from collections import deque
+
+import requests
+
+# Signature over the raw body, HMAC-SHA256 with the shared SECRET_KEY
+SIGNATURE_HEADER = 'X-Event-Signature'
+
+
+def sign_events(secret_key, body):
+    return hmac.new(secret_key.encode(), body, hashlib.sha256).hexdigest()
+
+
+class EventPublisher:
+    """Best-effort push of user events to the api-gateway event hub.
+
+    publish() only appends to a bounded queue, so it is safe to call under
+    the caller's own lock: events of one wallet leave in the order they were
+    published. A background thread posts queued events in batches. When the
+    queue is full or the gateway is unreachable, events are dropped and
+    counted; clients resync on reconnect.
+    """
+
+    def __init__(self, url, secret_key, max_queue=10000, batch_max=500, timeout=5):
+        self.url = url
+        self.secret_key = secret_key
+        self.max_queue = max_queue
+        self.batch_max = batch_max
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._thread = None
+        self.published = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.url)
+
+    def publish(self, user_id, event_type, data):
+        if not self.enabled:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._send_loop, name='event-publisher', daemon=True)
+                self._thread.start()
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append({'user_id': user_id, 'type': event_type, 'data': data})
+            self.published += 1
+            self._cond.notify()
+
+    def _send_loop(self):
+        session = requests.Session()
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_max))]
+
+            body = json.dumps({'events': batch}, separators=(',', ':')).encode()
+            headers = {
+                'Content-Type': 'application/json',
+                SIGNATURE_HEADER: sign_events(self.secret_key, body)
+            }
+            try:
+                response = session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+                ok = response.status_code < 300
+            except requests.exceptions.RequestException:
+                ok = False
+            if ok:
+                self.sent += len(batch)
+            else:
+                self.errors += 1
+                self.dropped += len(batch)
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            'enabled': self.enabled,
+            'queued': queued,
+            'published': self.published,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
@@ -1,15 +1,20 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import jwt
 import datetime
-from functools import wraps
 import os
 import requests
+import sys
+
+# Modul bersama ada di ../common (di image Docker: ./common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.auth import TokenVerifier, identity_header
 
 app = Flask(__name__)
 CORS(app)
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'digital-wallet-secret-key-2024')
+INTERNAL_IDENTITY_KEY = os.getenv('INTERNAL_IDENTITY_KEY', '')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
 WALLET_SERVICE_URL = os.getenv('WALLET_SERVICE_URL', 'http://localhost:5002')
 TRANSACTION_SERVICE_URL = os.getenv('TRANSACTION_SERVICE_URL', 'http://localhost:5003')
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 5))
@@ -30,32 +35,14 @@ payments_db = {
 
 next_payment_id = 2
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        return f(current_user_id, *args, **kwargs)
-    
-    return decorated
+# Verifikasi JWT (common/auth.py), hasil verifikasi di-cache sampai token expire
+token_verifier = TokenVerifier(SECRET_KEY, INTERNAL_IDENTITY_KEY, max_entries=TOKEN_CACHE_SIZE)
+token_required = token_verifier.required
 
 def get_wallet_info(wallet_id, token):
     """Get wallet information from wallet service"""
     try:
-        headers = {'Authorization': f'Bearer {token}'}
+        headers = {'Authorization': f'Bearer {token}', **identity_header()}
         response = requests.get(
             f'{WALLET_SERVICE_URL}/wallets/{wallet_id}',
             headers=headers,
@@ -72,7 +59,7 @@ def get_wallet_info(wallet_id, token):
 def deduct_wallet(wallet_id, amount, token):
     """Deduct amount from wallet"""
     try:
-        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json', **identity_header()}
         response = requests.post(
             f'{WALLET_SERVICE_URL}/wallets/{wallet_id}/deduct',
             json={'amount': amount},
@@ -85,26 +72,28 @@ def deduct_wallet(wallet_id, amount, token):
     except requests.exceptions.RequestException:
         return False
 
-def topup_wallet(wallet_id, amount, token):
-    """Top up wallet"""
+def transfer_funds(from_wallet_id, to_user_id, amount, token):
+    """Atomic transfer di wallet service; return (body, status)"""
     try:
-        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json', **identity_header()}
         response = requests.post(
-            f'{WALLET_SERVICE_URL}/wallets/{wallet_id}/topup',
-            json={'amount': amount},
+            f'{WALLET_SERVICE_URL}/wallets/transfer',
+            json={'from_wallet_id': from_wallet_id, 'to_user_id': to_user_id, 'amount': amount},
             headers=headers,
             timeout=REQUEST_TIMEOUT
         )
-        return response.status_code == 200
+        return response.json(), response.status_code
     except requests.exceptions.Timeout:
-        return False
+        return {'error': 'Request timeout'}, 504
     except requests.exceptions.RequestException:
-        return False
+        return {'error': 'Service unavailable'}, 503
+    except ValueError:
+        return {'error': 'Transfer failed'}, 500
 
 def create_transaction_record(wallet_id, trans_type, amount, description, token):
     """Create transaction record"""
     try:
-        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json', **identity_header()}
         response = requests.post(
             f'{TRANSACTION_SERVICE_URL}/transactions',
             json={
@@ -130,6 +119,13 @@ def health_check():
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'service': 'payment-service',
+        'token_cache': token_verifier.stats()
+    })
+
 @app.route('/payments', methods=['GET'])
 @token_required
 def get_payments(current_user_id):
@@ -225,40 +221,10 @@ def process_transfer(current_user_id):
     
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     
-    # Verify source wallet
-    from_wallet = get_wallet_info(data['from_wallet_id'], token)
-    if not from_wallet or from_wallet['user_id'] != current_user_id:
-        return jsonify({'error': 'Invalid source wallet'}), 400
-    
-    # Check balance
-    if from_wallet['balance'] < data['amount']:
-        return jsonify({'error': 'Insufficient balance'}), 400
-    
-    # Get destination wallet
-    try:
-        headers = {'Authorization': f'Bearer {token}'}
-        response = requests.get(
-            f'{WALLET_SERVICE_URL}/wallets/user/{data["to_user_id"]}',
-            headers=headers,
-            timeout=REQUEST_TIMEOUT
-        )
-        if response.status_code != 200:
-            return jsonify({'error': 'Destination user not found'}), 404
-        to_wallet = response.json().get('wallet')
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Request timeout'}), 504
-    except requests.exceptions.RequestException:
-        return jsonify({'error': 'Service unavailable'}), 503
-    
-    # Deduct from source
-    if not deduct_wallet(data['from_wallet_id'], data['amount'], token):
-        return jsonify({'error': 'Transfer failed'}), 500
-    
-    # Add to destination
-    if not topup_wallet(to_wallet['id'], data['amount'], token):
-        # Rollback source deduction
-        topup_wallet(data['from_wallet_id'], data['amount'], token)
-        return jsonify({'error': 'Transfer failed'}), 500
+    # Cek wallet, saldo dan pindahkan dana dalam satu panggilan ke wallet service
+    result, status = transfer_funds(data['from_wallet_id'], data['to_user_id'], data['amount'], token)
+    if status != 200:
+        return jsonify({'error': result.get('error', 'Transfer failed')}), status
     
     # Create transaction records
     create_transaction_record(
@@ -272,7 +238,7 @@ def process_transfer(current_user_id):
     return jsonify({
         'message': 'Transfer successful',
         'from_wallet_id': data['from_wallet_id'],
-        'to_wallet_id': to_wallet['id'],
+        'to_wallet_id': result['to_wallet_id'],
         'amount': data['amount']
     }), 201
 
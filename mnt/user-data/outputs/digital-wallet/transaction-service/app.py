@@ -1,17 +1,29 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import jwt
+import bisect
 import datetime
-from functools import wraps
 import os
 import requests
+import sys
+import threading
+
+# Modul bersama ada di ../common (di image Docker: ./common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.auth import TokenVerifier, identity_header
+from common.events import EventPublisher
 
 app = Flask(__name__)
 CORS(app)
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'digital-wallet-secret-key-2024')
+INTERNAL_IDENTITY_KEY = os.getenv('INTERNAL_IDENTITY_KEY', '')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
 WALLET_SERVICE_URL = os.getenv('WALLET_SERVICE_URL', 'http://localhost:5002')
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 5))
+# Event hub api-gateway untuk SSE /api/events (kosong = nonaktif)
+EVENTS_URL = os.getenv('EVENTS_URL', 'http://localhost:5050/internal/events')
+TRANSACTIONS_PAGE_SIZE = int(os.getenv('TRANSACTIONS_PAGE_SIZE', 50))
+TRANSACTIONS_PAGE_MAX = int(os.getenv('TRANSACTIONS_PAGE_MAX', 200))
 
 # Database transaksi (in-memory)
 transactions_db = {
@@ -48,33 +60,142 @@ transactions_db = {
 }
 
 next_transaction_id = 4
+transactions_lock = threading.Lock()
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        return f(current_user_id, *args, **kwargs)
+# Index user_id / wallet_id -> [id transaksi] urut (created_at, id), dijaga di
+# create_transaction. Riwayat dibaca dari index, bukan scan seluruh transactions_db.
+# Index *_type dengan key (owner, type) untuk filter ?type=.
+transactions_by_user = {}
+transactions_by_wallet = {}
+transactions_by_user_type = {}
+transactions_by_wallet_type = {}
+
+def transaction_order(transaction_id):
+    return (transactions_db[transaction_id]['created_at'], transaction_id)
+
+def index_transaction(transaction):
+    order = (transaction['created_at'], transaction['id'])
+    for index, owner in ((transactions_by_user, transaction['user_id']),
+                         (transactions_by_wallet, transaction['wallet_id']),
+                         (transactions_by_user_type, (transaction['user_id'], transaction['type'])),
+                         (transactions_by_wallet_type, (transaction['wallet_id'], transaction['type']))):
+        ids = index.setdefault(owner, [])
+        if not ids or transaction_order(ids[-1]) <= order:
+            ids.append(transaction['id'])
+        else:
+            ids.insert(bisect.bisect(ids, order, key=transaction_order), transaction['id'])
+
+# Statistik per user (jumlah & total per tipe), di-update O(1) di create_transaction
+TRANSACTION_TYPES = ['topup', 'payment', 'transfer', 'withdrawal']
+stats_by_user = {}
+
+def empty_stats():
+    return {'count': 0, **{trans_type: 0 for trans_type in TRANSACTION_TYPES}}
+
+def add_to_stats(stats, transaction):
+    stats['count'] += 1
+    stats[transaction['type']] += transaction['amount']
+
+def compute_stats():
+    """Hitung ulang statistik semua user dari transactions_db"""
+    computed = {}
+    for transaction in transactions_db.values():
+        add_to_stats(computed.setdefault(transaction['user_id'], empty_stats()), transaction)
+    return computed
+
+def verify_stats(repair=False):
+    """Bandingkan stats_by_user dengan hasil hitung ulang; repair=True menimpa yang beda"""
+    with transactions_lock:
+        computed = compute_stats()
+        drift = []
+        for user_id in computed.keys() | stats_by_user.keys():
+            expected = computed.get(user_id, empty_stats())
+            actual = stats_by_user.get(user_id, empty_stats())
+            if expected != actual:
+                drift.append({'user_id': user_id, 'expected': expected, 'actual': actual})
+        if repair:
+            stats_by_user.clear()
+            stats_by_user.update(computed)
+    return {'users': len(computed), 'drift': drift, 'repaired': repair and bool(drift)}
+
+for _transaction in transactions_db.values():
+    index_transaction(_transaction)
+stats_by_user.update(compute_stats())
+
+def parse_time(value):
+    """Waktu ISO 8601 -> string yang bisa dibandingkan langsung dengan created_at"""
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        # created_at disimpan dalam waktu lokal server tanpa zona waktu
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+def parse_history_query(args):
+    """Parameter riwayat dari query string: (query, None) atau (None, pesan error)
+
+    ?limit=N (max TRANSACTIONS_PAGE_MAX), ?cursor=<next_cursor>, ?since= dan ?until=
+    (ISO 8601, since inklusif, until eksklusif), ?type=topup|payment|transfer|withdrawal
+    """
+    try:
+        limit = int(args.get('limit', TRANSACTIONS_PAGE_SIZE))
+        cursor = int(args['cursor']) if 'cursor' in args else None
+    except ValueError:
+        return None, 'limit and cursor must be integers'
+    if limit < 1:
+        return None, 'limit must be positive'
+    if cursor is not None and cursor not in transactions_db:
+        return None, 'Invalid cursor'
+    
+    try:
+        since = parse_time(args['since']) if 'since' in args else None
+        until = parse_time(args['until']) if 'until' in args else None
+    except ValueError:
+        return None, 'since and until must be ISO 8601 timestamps'
     
-    return decorated
+    trans_type = args.get('type')
+    if trans_type is not None and trans_type not in TRANSACTION_TYPES:
+        return None, 'Invalid transaction type'
+    
+    return {
+        'limit': min(limit, TRANSACTIONS_PAGE_MAX),
+        'cursor': cursor,
+        'since': since,
+        'until': until,
+        'type': trans_type
+    }, None
+
+def history_page(index, type_index, owner, query):
+    """Satu halaman riwayat owner, terbaru dulu: (transaksi, next_cursor)
+
+    Batas halaman dicari dengan bisect di index, jadi biayanya O(log n + limit).
+    """
+    if query['type']:
+        index, owner = type_index, (owner, query['type'])
+    
+    with transactions_lock:
+        ids = index.get(owner, [])
+        lo = bisect.bisect_left(ids, (query['since'],), key=transaction_order) if query['since'] else 0
+        hi = bisect.bisect_left(ids, (query['until'],), key=transaction_order) if query['until'] else len(ids)
+        if query['cursor'] is not None:
+            hi = min(hi, bisect.bisect_left(ids, transaction_order(query['cursor']), key=transaction_order))
+        start = max(lo, hi - query['limit'])
+        page_ids = ids[start:hi]
+    
+    transactions = [transactions_db[transaction_id] for transaction_id in reversed(page_ids)]
+    next_cursor = str(page_ids[0]) if page_ids and start > lo else None
+    return transactions, next_cursor
+
+# Verifikasi JWT (common/auth.py), hasil verifikasi di-cache sampai token expire
+token_verifier = TokenVerifier(SECRET_KEY, INTERNAL_IDENTITY_KEY, max_entries=TOKEN_CACHE_SIZE)
+token_required = token_verifier.required
+
+# Transaksi baru dikirim ke api-gateway (SSE)
+event_publisher = EventPublisher(EVENTS_URL, SECRET_KEY, timeout=REQUEST_TIMEOUT)
 
 def get_wallet_info(wallet_id, token):
     """Get wallet information from wallet service"""
     try:
-        headers = {'Authorization': f'Bearer {token}'}
+        headers = {'Authorization': f'Bearer {token}', **identity_header()}
         response = requests.get(
             f'{WALLET_SERVICE_URL}/wallets/{wallet_id}',
             headers=headers,
@@ -96,19 +217,30 @@ def health_check():
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'service': 'transaction-service',
+        'token_cache': token_verifier.stats(),
+        'events': event_publisher.stats()
+    })
+
 @app.route('/transactions', methods=['GET'])
 @token_required
 def get_transactions(current_user_id):
-    """Get all transactions for current user"""
-    user_transactions = [
-        t for t in transactions_db.values() 
-        if t['user_id'] == current_user_id
-    ]
+    """Get transactions for current user, terbaru dulu, per halaman
+
+    Lihat parse_history_query untuk limit, cursor, since, until dan type.
+    """
+    query, error = parse_history_query(request.args)
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Sort by created_at descending
-    user_transactions.sort(key=lambda x: x['created_at'], reverse=True)
+    user_transactions, next_cursor = history_page(
+        transactions_by_user, transactions_by_user_type, current_user_id, query
+    )
     
-    return jsonify({'transactions': user_transactions})
+    return jsonify({'transactions': user_transactions, 'next_cursor': next_cursor})
 
 @app.route('/transactions/<int:transaction_id>', methods=['GET'])
 @token_required
@@ -151,33 +283,41 @@ def create_transaction(current_user_id):
         return jsonify({'error': 'Invalid wallet'}), 400
     
     # Validate transaction type
-    if data['type'] not in ['topup', 'payment', 'transfer', 'withdrawal']:
+    if data['type'] not in TRANSACTION_TYPES:
         return jsonify({'error': 'Invalid transaction type'}), 400
     
     # Validate amount
     if data['amount'] <= 0:
         return jsonify({'error': 'Invalid amount'}), 400
     
-    new_transaction = {
-        'id': next_transaction_id,
-        'user_id': current_user_id,
-        'wallet_id': data['wallet_id'],
-        'type': data['type'],
-        'amount': data['amount'],
-        'description': data['description'],
-        'status': 'completed',
-        'created_at': datetime.datetime.now().isoformat()
-    }
-    
-    transactions_db[next_transaction_id] = new_transaction
-    next_transaction_id += 1
+    with transactions_lock:
+        new_transaction = {
+            'id': next_transaction_id,
+            'user_id': current_user_id,
+            'wallet_id': data['wallet_id'],
+            'type': data['type'],
+            'amount': data['amount'],
+            'description': data['description'],
+            'status': 'completed',
+            'created_at': datetime.datetime.now().isoformat()
+        }
+        
+        transactions_db[next_transaction_id] = new_transaction
+        index_transaction(new_transaction)
+        add_to_stats(stats_by_user.setdefault(current_user_id, empty_stats()), new_transaction)
+        next_transaction_id += 1
+    event_publisher.publish(current_user_id, 'transaction.created', new_transaction)
     
     return jsonify({'transaction': new_transaction}), 201
 
 @app.route('/transactions/wallet/<int:wallet_id>', methods=['GET'])
 @token_required
 def get_transactions_by_wallet(current_user_id, wallet_id):
-    """Get all transactions for a specific wallet"""
+    """Get transactions for a specific wallet (parameter sama dengan GET /transactions)"""
+    query, error = parse_history_query(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    
     # Verify wallet belongs to user
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     wallet = get_wallet_info(wallet_id, token)
@@ -185,37 +325,39 @@ def get_transactions_by_wallet(current_user_id, wallet_id):
     if not wallet or wallet['user_id'] != current_user_id:
         return jsonify({'error': 'Invalid wallet'}), 403
     
-    wallet_transactions = [
-        t for t in transactions_db.values() 
-        if t['wallet_id'] == wallet_id
-    ]
+    wallet_transactions, next_cursor = history_page(
+        transactions_by_wallet, transactions_by_wallet_type, wallet_id, query
+    )
     
-    wallet_transactions.sort(key=lambda x: x['created_at'], reverse=True)
-    
-    return jsonify({'transactions': wallet_transactions})
+    return jsonify({'transactions': wallet_transactions, 'next_cursor': next_cursor})
 
 @app.route('/transactions/stats', methods=['GET'])
 @token_required
 def get_transaction_stats(current_user_id):
     """Get transaction statistics for current user"""
-    user_transactions = [
-        t for t in transactions_db.values() 
-        if t['user_id'] == current_user_id
-    ]
-    
-    total_transactions = len(user_transactions)
-    total_topup = sum(t['amount'] for t in user_transactions if t['type'] == 'topup')
-    total_payment = sum(t['amount'] for t in user_transactions if t['type'] == 'payment')
-    total_transfer = sum(t['amount'] for t in user_transactions if t['type'] == 'transfer')
+    with transactions_lock:
+        stats = dict(stats_by_user.get(current_user_id) or empty_stats())
     
     return jsonify({
-        'total_transactions': total_transactions,
-        'total_topup': total_topup,
-        'total_payment': total_payment,
-        'total_transfer': total_transfer,
-        'net_amount': total_topup - total_payment - total_transfer
+        'total_transactions': stats['count'],
+        'total_topup': stats['topup'],
+        'total_payment': stats['payment'],
+        'total_transfer': stats['transfer'],
+        'net_amount': stats['topup'] - stats['payment'] - stats['transfer']
     })
 
+@app.route('/internal/transactions/stats/verify', methods=['POST'])
+@token_verifier.internal
+def verify_transaction_stats():
+    """Cek statistik incremental terhadap data transaksi (internal use)
+
+    Body opsional: {"repair": true} untuk menimpa statistik yang berbeda.
+    Hanya untuk request dengan credential internal (common/auth.py), bukan token user:
+    scan penuh di bawah lock dan hasilnya berisi statistik semua user.
+    """
+    data = request.get_json(silent=True) or {}
+    return jsonify(verify_stats(repair=data.get('repair') is True))
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5003))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -1,9 +1,17 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import jwt
+import bisect
 import datetime
-from functools import wraps
 import os
+import sys
+import threading
+import requests
+
+# Modul bersama ada di ../common (di image Docker: ./common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.auth import TokenVerifier, identity_header
+from passwords import PasswordHasher
 
 app = Flask(__name__)
 
@@ -14,8 +22,24 @@ CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
 # Secret key untuk JWT
 SECRET_KEY = os.getenv('SECRET_KEY', 'digital-wallet-secret-key-2024')
+INTERNAL_IDENTITY_KEY = os.getenv('INTERNAL_IDENTITY_KEY', '')
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+WALLET_SERVICE_URL = os.getenv('WALLET_SERVICE_URL', 'http://localhost:5002')
+REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 5))
+
+# Password hashing (scrypt). Naikkan PASSWORD_HASH_N untuk cost yang lebih tinggi
+PASSWORD_HASH_N = int(os.getenv('PASSWORD_HASH_N', 2 ** 14))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0)) or None
+
+# Pagination /users dan batch lookup
+USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', 50))
+USERS_PAGE_MAX = int(os.getenv('USERS_PAGE_MAX', 200))
+USERS_BATCH_MAX = int(os.getenv('USERS_BATCH_MAX', 200))
+
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, n=PASSWORD_HASH_N)
 
 # Database sederhana (in-memory)
+# Password plaintext di bawah di-hash otomatis saat login berikutnya
 users_db = {
     1: {
         'id': 1,
@@ -42,28 +66,62 @@ users_db = {
 
 next_user_id = 4
 
-# Decorator untuk verifikasi JWT
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        
-        return f(current_user_id, *args, **kwargs)
-    
-    return decorated
+# Index email (lowercase) dan phone -> user id, supaya login/register O(1)
+users_by_email = {}
+users_by_phone = {}
+# Id user terurut, untuk cursor pagination
+user_ids = sorted(users_db)
+users_lock = threading.Lock()
+
+def normalize_email(email):
+    return email.strip().lower()
+
+def index_user(user):
+    users_by_email[normalize_email(user['email'])] = user['id']
+    users_by_phone[user['phone']] = user['id']
+
+def unindex_user(user):
+    users_by_email.pop(normalize_email(user['email']), None)
+    if users_by_phone.get(user['phone']) == user['id']:
+        del users_by_phone[user['phone']]
+
+def find_user_by_email(email):
+    return users_db.get(users_by_email.get(normalize_email(email)))
+
+for _user in users_db.values():
+    index_user(_user)
+
+# Field yang boleh dikembalikan (password tidak pernah)
+USER_FIELDS = ('id', 'name', 'email', 'phone')
+
+def parse_fields(value):
+    """Projection dari ?fields=name,email; None jika ada field yang tidak dikenal"""
+    if not value:
+        return USER_FIELDS
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    if any(f not in USER_FIELDS for f in fields):
+        return None
+    return ('id',) + tuple(f for f in USER_FIELDS[1:] if f in fields)
+
+def project_user(user, fields=USER_FIELDS):
+    return {field: user[field] for field in fields}
+
+# Verifikasi JWT (common/auth.py), hasil verifikasi di-cache sampai token expire
+token_verifier = TokenVerifier(SECRET_KEY, INTERNAL_IDENTITY_KEY, max_entries=TOKEN_CACHE_SIZE)
+token_required = token_verifier.required
+
+def notify_user_deleted(user_id):
+    """Minta wallet service membuang cache verifikasi user ini (best effort)"""
+    try:
+        headers = {'Authorization': request.headers.get('Authorization', ''), **identity_header()}
+        requests.post(
+            f'{WALLET_SERVICE_URL}/internal/users/{user_id}/invalidate',
+            headers=headers,
+            timeout=REQUEST_TIMEOUT
+        )
+    except requests.exceptions.RequestException:
+        # Entry di wallet service tetap hilang sendiri setelah USER_CACHE_TTL
+        pass
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -73,6 +131,13 @@ def health_check():
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'service': 'user-service',
+        'token_cache': token_verifier.stats()
+    })
+
 @app.route('/auth/login', methods=['POST'])
 def login():
     """Login endpoint - generate JWT token"""
@@ -81,16 +146,23 @@ def login():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Email and password required'}), 400
     
+    if not isinstance(data['email'], str) or not isinstance(data['password'], str):
+        return jsonify({'error': 'Email and password must be strings'}), 400
+    
     # Cari user berdasarkan email
-    user = None
-    for u in users_db.values():
-        if u['email'] == data['email']:
-            user = u
-            break
+    user = find_user_by_email(data['email'])
+    stored = user['password'] if user else None
+    matches, needs_rehash = password_hasher.verify(data['password'], stored)
     
-    if not user or user['password'] != data['password']:
+    if not user or not matches:
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    if needs_rehash:
+        password_hash = password_hasher.hash(data['password'])
+        with users_lock:
+            if user['password'] == stored:
+                user['password'] = password_hash
+    
     # Generate JWT token
     token = jwt.encode({
         'user_id': user['id'],
@@ -115,24 +187,37 @@ def register():
     data = request.get_json()
     
     required_fields = ['name', 'email', 'phone', 'password']
-    if not all(field in data for field in required_fields):
+    if not data or not all(field in data for field in required_fields):
         return jsonify({'error': 'All fields required'}), 400
     
-    # Check if email already exists
-    for u in users_db.values():
-        if u['email'] == data['email']:
-            return jsonify({'error': 'Email already registered'}), 400
+    if not all(isinstance(data[field], str) for field in required_fields):
+        return jsonify({'error': 'All fields must be strings'}), 400
     
-    # Create new user
-    new_user = {
-        'id': next_user_id,
-        'name': data['name'],
-        'email': data['email'],
-        'phone': data['phone'],
-        'password': data['password']
-    }
-    users_db[next_user_id] = new_user
-    next_user_id += 1
+    if normalize_email(data['email']) in users_by_email:
+        return jsonify({'error': 'Email already registered'}), 400
+    
+    # Hash di luar lock karena lambat, lalu cek ulang di dalam lock
+    password_hash = password_hasher.hash(data['password'])
+    
+    with users_lock:
+        # Check if email or phone already exists
+        if normalize_email(data['email']) in users_by_email:
+            return jsonify({'error': 'Email already registered'}), 400
+        if data['phone'] in users_by_phone:
+            return jsonify({'error': 'Phone already registered'}), 400
+        
+        # Create new user
+        new_user = {
+            'id': next_user_id,
+            'name': data['name'],
+            'email': data['email'],
+            'phone': data['phone'],
+            'password': password_hash
+        }
+        users_db[next_user_id] = new_user
+        index_user(new_user)
+        bisect.insort(user_ids, next_user_id)
+        next_user_id += 1
     
     # Generate token
     token = jwt.encode({
@@ -154,17 +239,63 @@ def register():
 @app.route('/users', methods=['GET'])
 @token_required
 def get_users(current_user_id):
-    """Get all users (protected)"""
-    users_list = [
-        {
-            'id': u['id'],
-            'name': u['name'],
-            'email': u['email'],
-            'phone': u['phone']
-        }
-        for u in users_db.values()
-    ]
-    return jsonify({'users': users_list})
+    """List users per halaman (protected)
+
+    ?limit=N (max USERS_PAGE_MAX), ?cursor=<next_cursor dari halaman sebelumnya>,
+    ?fields=name,email untuk projection
+    """
+    fields = parse_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'error': f'fields must be a subset of {", ".join(USER_FIELDS)}'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', USERS_PAGE_SIZE))
+        cursor = int(request.args.get('cursor', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    limit = min(limit, USERS_PAGE_MAX)
+    
+    with users_lock:
+        start = bisect.bisect_right(user_ids, cursor)
+        page_ids = user_ids[start:start + limit]
+        has_more = start + limit < len(user_ids)
+        users_list = [project_user(users_db[uid], fields) for uid in page_ids]
+    
+    return jsonify({
+        'users': users_list,
+        'next_cursor': str(page_ids[-1]) if has_more else None
+    })
+
+@app.route('/users/batch', methods=['GET'])
+@token_required
+def get_users_batch(current_user_id):
+    """Get banyak user sekaligus: ?ids=1,2,3 (protected)"""
+    fields = parse_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'error': f'fields must be a subset of {", ".join(USER_FIELDS)}'}), 400
+    
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be comma-separated integers'}), 400
+    if not ids:
+        return jsonify({'error': 'ids required'}), 400
+    if len(ids) > USERS_BATCH_MAX:
+        return jsonify({'error': f'At most {USERS_BATCH_MAX} ids per request'}), 400
+    
+    ids = list(dict.fromkeys(ids))
+    users_list = []
+    not_found = []
+    for uid in ids:
+        user = users_db.get(uid)
+        if user:
+            users_list.append(project_user(user, fields))
+        else:
+            not_found.append(uid)
+    
+    return jsonify({'users': users_list, 'not_found': not_found})
 
 @app.route('/users/<int:user_id>', methods=['GET'])
 @token_required
@@ -195,13 +326,24 @@ def update_user(current_user_id, user_id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON body required'}), 400
+    
+    # Sama seperti register: phone dipakai sebagai key index, harus string
+    if not all(isinstance(data[field], str) for field in ('name', 'email', 'phone') if field in data):
+        return jsonify({'error': 'name, email and phone must be strings'}), 400
     
     # Update fields
-    if 'name' in data:
-        user['name'] = data['name']
-    if 'phone' in data:
-        user['phone'] = data['phone']
+    with users_lock:
+        if 'phone' in data and data['phone'] != user['phone']:
+            if data['phone'] in users_by_phone:
+                return jsonify({'error': 'Phone already registered'}), 400
+            unindex_user(user)
+            user['phone'] = data['phone']
+            index_user(user)
+        if 'name' in data:
+            user['name'] = data['name']
     
     return jsonify({
         'user': {
@@ -219,10 +361,14 @@ def delete_user(current_user_id, user_id):
     if current_user_id != user_id:
         return jsonify({'error': 'Unauthorized to delete this user'}), 403
     
-    if user_id not in users_db:
-        return jsonify({'error': 'User not found'}), 404
+    with users_lock:
+        user = users_db.pop(user_id, None)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        unindex_user(user)
+        del user_ids[bisect.bisect_left(user_ids, user_id)]
     
-    del users_db[user_id]
+    notify_user_deleted(user_id)
     return jsonify({'message': 'User deleted successfully'})
 
 @app.route('/users/verify', methods=['GET'])
@@ -0,0 +1,73 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+SCHEME = 'scrypt'
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password, salt, n, r, p):
+    """Runs in a worker process"""
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=32)
+
+
+class PasswordHasher:
+    """Salted scrypt hashing on a bounded process pool.
+
+    Hashes are stored as 'scrypt$n$r$p$salt$hash'. The KDF runs in at most
+    `workers` processes, so a burst of logins queues up instead of starving
+    the request threads, which only wait on the result. Records that are
+    still plaintext, or hashed with an older cost, verify once and report
+    that they need rehashing.
+    """
+
+    def __init__(self, workers=None, n=2 ** 14, r=8, p=1):
+        self.workers = workers or os.cpu_count() or 1
+        self.n = n
+        self.r = r
+        self.p = p
+        self._lock = threading.Lock()
+        self._pool = None
+        # Verified when the email is unknown so timing does not reveal it
+        self._dummy = f'{SCHEME}${n}${r}${p}${_b64(os.urandom(16))}${_b64(os.urandom(32))}'
+
+    def _executor(self):
+        # Created lazily so the pool is forked after the app has started
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _derive(self, password, salt, n, r, p):
+        return self._executor().submit(_scrypt, password, salt, n, r, p).result()
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return f'{SCHEME}${self.n}${self.r}${self.p}${_b64(salt)}${_b64(key)}'
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash)"""
+        if stored is None:
+            stored = self._dummy
+        if not stored.startswith(SCHEME + '$'):
+            # Plaintext record from before hashing was introduced
+            return hmac.compare_digest(password.encode(), stored.encode()), True
+
+        try:
+            _, n, r, p, salt, key = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            salt, key = base64.b64decode(salt), base64.b64decode(key)
+        except ValueError:
+            return False, False
+
+        matches = hmac.compare_digest(self._derive(password, salt, n, r, p), key)
+        return matches, (n, r, p) != (self.n, self.r, self.p)
+
@@ -2,14 +2,20 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import jwt
 import datetime
-from functools import wraps
 import os
 import requests
+import sys
+
+# Modul bersama ada di ../common (di image Docker: ./common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.auth import TokenVerifier, identity_header
 
 app = Flask(__name__)
 CORS(app)
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'digital-wallet-secret-key-2024')
+INTERNAL_IDENTITY_KEY = os.getenv("INTERNAL_IDENTITY_KEY", "")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
 TRANSACTION_SERVICE_URL = os.getenv("TRANSACTION_SERVICE_URL", "http://localhost:5003")
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 5))
 # ===== DUMMY DATABASE =====
@@ -24,29 +30,16 @@ transactions = [
 ]
 
 # ===== TOKEN VALIDATION =====
-def token_required(f):
-    @wraps(f)
-    def decorator(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({"error": "Token missing"}), 401
-
-        try:
-            token = token.replace("Bearer ", "")
-            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user_id = data["user_id"]
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
-
-        return f(current_user_id, *args, **kwargs)
-    return decorator
+token_verifier = TokenVerifier(
+    SECRET_KEY, INTERNAL_IDENTITY_KEY, max_entries=TOKEN_CACHE_SIZE,
+    missing_message="Token missing", expired_message="Token expired"
+)
+token_required = token_verifier.required
 
 def record_transaction(user_id, wallet_id, txn_type, amount, description, token):
     """Kirim data transaksi ke transaction-service"""
     try:
-        headers = {"Authorization": f"Bearer {token}"}
+        headers = {"Authorization": f"Bearer {token}", **identity_header()}
         payload = {
             "wallet_id": wallet_id,
             "type": txn_type,
@@ -193,6 +186,10 @@ def get_stats(current_user_id):
 def health():
     return jsonify({"status": "wallet-service healthy"}), 200
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({"service": "wallet-service", "token_cache": token_verifier.stats()})
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5002))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Wallet-service di test: tanpa WAL di disk dan tanpa kirim event ke gateway
+os.environ.setdefault('WALLET_WAL_ENABLED', 'false')
+os.environ.setdefault('EVENTS_URL', '')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Modul api-gateway (breaker, cache, health, ...) diimport langsung; app.py di
+# root tetap menang karena ROOT ada di depan
+sys.path.insert(1, os.path.join(ROOT, 'mnt', 'user-data', 'outputs', 'digital-wallet', 'api-gateway'))
@@ -0,0 +1,106 @@
+import types
+
+import pytest
+
+import breaker as breaker_module
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def make_breaker(**options):
+    defaults = dict(window=10, min_calls=4, error_threshold=0.5, slow_call_seconds=1.0,
+                    slow_threshold=0.5, open_seconds=10, timeout_cap=5.0, timeout_floor=0.5)
+    return CircuitBreaker('wallet', **{**defaults, **options})
+
+
+def state(breaker):
+    return breaker.stats()['state']
+
+
+def test_opens_on_error_rate_only_after_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(False, 0.01)
+    assert state(breaker) == CLOSED
+
+    breaker.record(False, 0.01)
+    assert state(breaker) == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(True, 1.5)
+    assert state(breaker) == OPEN
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.01)
+
+    clock.now += 9.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert state(breaker) == HALF_OPEN
+    # Only one trial at a time
+    assert not breaker.allow()
+
+    breaker.record(True, 0.01)
+    assert state(breaker) == CLOSED
+    assert breaker.stats()['calls'] == 0
+    assert breaker.allow()
+    assert breaker.stats()['transitions'] == {'closed->open': 1, 'open->half_open': 1, 'half_open->closed': 1}
+
+
+@pytest.mark.parametrize('success, latency', [(False, 0.01), (True, 1.5)])
+def test_failed_or_slow_trial_reopens(clock, success, latency):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 0.01)
+    clock.now += 10
+    assert breaker.allow()
+
+    breaker.record(success, latency)
+    assert state(breaker) == OPEN
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_timeout_starts_at_cap_and_follows_latency(clock):
+    breaker = make_breaker(min_calls=10, timeout_percentile=99, timeout_multiplier=2.0)
+    assert breaker.timeout() == 5.0
+
+    for _ in range(10):
+        breaker.record(True, 0.4)
+    assert breaker.timeout() == 0.8
+
+
+def test_timeout_is_clamped_to_floor_and_cap(clock):
+    breaker = make_breaker(min_calls=10, slow_call_seconds=100)
+    for _ in range(10):
+        breaker.record(True, 0.01)
+    assert breaker.timeout() == 0.5
+
+    for _ in range(200):
+        breaker.record(True, 30.0)
+    assert breaker.timeout() == 5.0
@@ -0,0 +1,119 @@
+import threading
+import types
+
+import cache as cache_module
+from cache import ResponseCache
+from singleflight import SingleFlight
+
+
+def test_get_set_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    cache = ResponseCache(max_entries=10, ttl=5)
+    key = cache.key('user:1', '/api/wallets')
+
+    assert cache.get(key) is None
+    cache.set(key, '1', b'{}', 200, cache.epoch)
+    assert cache.get(key) == (b'{}', 200)
+
+    now[0] += 5
+    assert cache.get(key) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    for path in ('/a', '/b'):
+        cache.set(('p', path), '1', path, 200, cache.epoch)
+    cache.get(('p', '/a'))
+    cache.set(('p', '/c'), '1', '/c', 200, cache.epoch)
+
+    assert cache.get(('p', '/b')) is None
+    assert cache.get(('p', '/a')) == ('/a', 200)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate_user_drops_only_their_entries():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.set(('a', '/wallets'), '1', 'a', 200, cache.epoch)
+    cache.set(('b', '/wallets'), '2', 'b', 200, cache.epoch)
+
+    cache.invalidate_user('1')
+    assert cache.get(('a', '/wallets')) is None
+    assert cache.get(('b', '/wallets')) == ('b', 200)
+
+
+def test_fill_that_raced_an_invalidation_is_not_stored():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    key = ('a', '/wallets')
+    # A GET reads the epoch, then fetches from upstream...
+    epoch = cache.epoch
+    stale = b'{"balance": 100}'
+    # ...while a topup for the same user invalidates the cache
+    cache.invalidate_user('1')
+    cache.set(key, '1', stale, 200, epoch)
+
+    assert cache.get(key) is None
+    cache.set(key, '1', b'{"balance": 200}', 200, cache.epoch)
+    assert cache.get(key) == (b'{"balance": 200}', 200)
+
+
+def run_concurrently(flight, key, fn, callers):
+    results = []
+    errors = []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'body'
+
+    threads, results, errors = run_concurrently(flight, 'k', fetch, 8)
+    while flight.stats()['coalesced'] < 7:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['body'] * 8 and not errors
+    assert len(calls) == 1
+    assert flight.stats()['in_flight'] == 0
+
+    # The next call after completion goes upstream again
+    assert flight.do('k', lambda: 'fresh') == 'fresh'
+
+
+def test_single_flight_shares_the_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise TimeoutError('upstream timeout')
+
+    threads, results, errors = run_concurrently(flight, 'k', fetch, 4)
+    while flight.stats()['coalesced'] < 3:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not results
+    assert len(errors) == 4 and all(isinstance(e, TimeoutError) for e in errors)
+    assert flight.stats()['in_flight'] == 0
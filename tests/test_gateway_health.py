@@ -0,0 +1,28 @@
+from health import HealthState
+
+SERVICES = {'user': 'http://user', 'wallet': 'http://wallet'}
+
+
+def test_unprobed_services_are_starting_not_failing():
+    state = HealthState(SERVICES)
+    snapshot, ok = state.snapshot()
+    assert ok
+    assert snapshot['status'] == 'starting'
+    assert state.is_reachable('http://wallet')
+
+    state.record('user', 'healthy', 0.01)
+    snapshot, ok = state.snapshot()
+    assert ok and snapshot['status'] == 'starting'
+
+    state.record('wallet', 'healthy', 0.01)
+    snapshot, ok = state.snapshot()
+    assert ok and snapshot['status'] == 'healthy'
+
+
+def test_failing_service_degrades_health():
+    state = HealthState(SERVICES)
+    state.record('wallet', 'unreachable', 2.0)
+    snapshot, ok = state.snapshot()
+    assert not ok
+    assert snapshot['status'] == 'degraded'
+    assert not state.is_reachable('http://wallet')
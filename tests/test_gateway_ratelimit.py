@@ -0,0 +1,106 @@
+import time
+import types
+
+import jwt
+import pytest
+
+import ratelimit
+from config import SECRET_KEY
+from ratelimit import RateLimiter, client_key, parse_limits, retry_after_header
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def bearer(user_id, exp_in=3600, secret=SECRET_KEY):
+    token = jwt.encode({'user_id': user_id, 'exp': int(time.time()) + exp_in}, secret, algorithm='HS256')
+    return f'Bearer {token}'
+
+
+def test_parse_limits():
+    assert parse_limits('default=20:40, login=0.5:5,pay=2') == {
+        'default': (20.0, 40.0), 'login': (0.5, 5.0), 'pay': (2.0, 2.0)
+    }
+
+
+def test_burst_then_refill(clock):
+    limiter = RateLimiter({'pay': (2, 3)})
+    assert [limiter.acquire('pay', 'user:1') for _ in range(3)] == [0, 0, 0]
+
+    wait = limiter.acquire('pay', 'user:1')
+    assert wait == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert limiter.acquire('pay', 'user:1') == 0
+    assert limiter.acquire('pay', 'user:1') > 0
+
+    # Refill is capped at the burst size
+    clock[0] += 100
+    assert [limiter.acquire('pay', 'user:1') for _ in range(4)][-1] > 0
+
+
+def test_buckets_are_per_route_and_client(clock):
+    limiter = RateLimiter({'pay': (1, 1), 'default': (1, 1)})
+    assert limiter.acquire('pay', 'user:1') == 0
+    assert limiter.acquire('pay', 'user:2') == 0
+    assert limiter.acquire('get_wallets', 'user:1') == 0
+    assert limiter.acquire('pay', 'user:1') > 0
+
+
+def test_route_without_limit_is_not_limited(clock):
+    limiter = RateLimiter({'pay': (1, 1)})
+    assert all(limiter.acquire('get_wallets', 'user:1') == 0 for _ in range(100))
+    assert limiter.stats()['buckets'] == 0
+
+
+def test_lru_evicts_least_recently_used_bucket(clock):
+    limiter = RateLimiter({'default': (1, 1)}, max_buckets=2)
+    limiter.acquire('r', 'a')
+    limiter.acquire('r', 'b')
+    limiter.acquire('r', 'a')  # a is now most recent, and empty
+    limiter.acquire('r', 'c')  # evicts b
+
+    assert limiter.stats()['buckets'] == 2
+    assert limiter.stats()['evictions'] == 1
+    assert limiter.acquire('r', 'a') > 0
+    assert limiter.acquire('r', 'b') == 0  # fresh bucket again
+
+
+@pytest.mark.parametrize('seconds, header', [(0.01, '1'), (1.0, '1'), (1.2, '2'), (7200, '3600'),
+                                             (float('inf'), '3600')])
+def test_retry_after_header(seconds, header):
+    assert retry_after_header(seconds) == header
+
+
+def test_client_key_uses_verified_user():
+    assert client_key('get_wallets', bearer(7), '10.0.0.1') == 'user:7'
+    # Every token of a user shares the bucket
+    assert client_key('get_wallets', bearer(7, exp_in=60), '10.0.0.2') == 'user:7'
+
+
+@pytest.mark.parametrize('authorization', [
+    'Bearer not-a-jwt',
+    bearer(7, secret='forged-secret'),
+    bearer(7, exp_in=-10),
+    None
+])
+def test_client_key_falls_back_to_ip_for_unverified_tokens(authorization):
+    assert client_key('get_wallets', authorization, '10.0.0.1') == 'ip:10.0.0.1'
+
+
+def test_made_up_tokens_share_one_bucket(clock):
+    limiter = RateLimiter({'default': (1, 5)})
+    keys = {client_key('get_wallets', f'Bearer fake{i}', '10.0.0.1') for i in range(50)}
+    assert keys == {'ip:10.0.0.1'}
+    results = [limiter.acquire('get_wallets', key) for key in
+               (client_key('get_wallets', f'Bearer fake{i}', '10.0.0.1') for i in range(10))]
+    assert results.count(0) == 5
+    assert limiter.stats()['buckets'] == 1
+
+
+def test_login_is_keyed_by_ip_even_with_a_token():
+    assert client_key('login', bearer(7), '10.0.0.1') == 'ip:10.0.0.1'
@@ -0,0 +1,174 @@
+import datetime
+import os
+import threading
+import time
+
+import jwt
+import pytest
+
+import app as wallet_service
+from wal import WALError, WriteAheadLog
+from wallet_store import WalletStore
+
+
+class TornFile:
+    """Log file whose next write stops halfway and fails, like a full disk"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        self.file.write(bytes(data[:len(data) // 2]))
+        raise OSError(28, 'No space left on device')
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def open_log(directory, records=None):
+    log = WriteAheadLog(str(directory), fsync=True, snapshot_interval=0)
+    log.recover(lambda state: None, records.append if records is not None else lambda record: None)
+    log.start(lambda: {})
+    return log
+
+
+def replayed(directory):
+    records = []
+    open_log(directory, records)
+    return [record['n'] for record in records]
+
+
+def test_failed_write_is_cut_off_and_stops_the_log(tmp_path):
+    log = open_log(tmp_path)
+    for n in range(3):
+        log.append({'n': n}).wait()
+
+    log._file = TornFile(log._file)
+    with pytest.raises(WALError):
+        log.append({'n': 3}).wait()
+
+    assert log.broken
+    with pytest.raises(WALError):
+        log.append({'n': 4})
+    with pytest.raises(WALError):
+        log.snapshot()
+    assert replayed(tmp_path) == [0, 1, 2]
+
+
+def test_failed_fsync_stops_the_log(tmp_path, monkeypatch):
+    log = open_log(tmp_path)
+    log.append({'n': 0}).wait()
+
+    def failing_fsync(fd):
+        raise OSError(5, 'Input/output error')
+
+    monkeypatch.setattr(os, 'fsync', failing_fsync)
+    with pytest.raises(WALError):
+        log.append({'n': 1}).wait()
+    monkeypatch.undo()
+
+    # Even once the disk is back, nothing more is written
+    with pytest.raises(WALError):
+        log.append({'n': 2})
+    assert log.stats()['broken']
+    assert replayed(tmp_path) == [0]
+
+
+@pytest.fixture
+def broken_wallet_log(tmp_path, monkeypatch):
+    log = open_log(tmp_path)
+    monkeypatch.setattr(wallet_service, 'wallet_log', log)
+    return log
+
+
+def auth_headers(user_id):
+    token = jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, wallet_service.SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_wallet_service_rejects_changes_after_wal_failure(tmp_path, broken_wallet_log):
+    client = wallet_service.app.test_client()
+    wallet_id = wallet_service.wallets_by_user[1]
+    headers = auth_headers(1)
+    balance = wallet_service.wallets_db.balance(wallet_id)
+
+    response = client.post(f'/wallets/{wallet_id}/topup', json={'amount': 100}, headers=headers)
+    assert response.status_code == 200
+    balance += 100
+
+    broken_wallet_log._file = TornFile(broken_wallet_log._file)
+    response = client.post(f'/wallets/{wallet_id}/topup', json={'amount': 5}, headers=headers)
+    assert response.status_code == 503
+    # The failed change never reached memory, same as after a restart
+    assert wallet_service.wallets_db.balance(wallet_id) == balance
+
+    for path, body in [
+        (f'/wallets/{wallet_id}/topup', {'amount': 5}),
+        (f'/wallets/{wallet_id}/deduct', {'amount': 5}),
+        ('/wallets/transfer', {'from_wallet_id': wallet_id, 'to_user_id': 2, 'amount': 5}),
+        ('/wallets/mutations/batch', {'entries': [{'wallet_id': wallet_id, 'type': 'credit', 'amount': 5}]})
+    ]:
+        response = client.post(path, json=body, headers=headers)
+        assert response.status_code == 503, path
+        assert wallet_service.wallets_db.balance(wallet_id) == balance
+
+    assert client.get('/health').status_code == 503
+
+    records = []
+    open_log(tmp_path, records)
+    assert [record['balance'] for record in records] == [balance]
+
+
+class SlowAppendLog(WriteAheadLog):
+    """Log whose callers get preempted right after queueing a record"""
+
+    def append(self, record):
+        commit = super().append(record)
+        time.sleep(0.001)
+        return commit
+
+
+def test_snapshot_during_writes_keeps_every_acknowledged_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(wallet_service, 'wallets_db', wallet_service.wallets_db.copy())
+    monkeypatch.setattr(wallet_service, 'wallets_by_user', dict(wallet_service.wallets_by_user))
+    monkeypatch.setattr(wallet_service, 'verify_user_exists', lambda user_id, token: True)
+    log = SlowAppendLog(str(tmp_path), fsync=False, snapshot_interval=0)
+    log.recover(lambda state: None, lambda record: None)
+    log.start(wallet_service.wallet_snapshot_state)
+    monkeypatch.setattr(wallet_service, 'wallet_log', log)
+    log.snapshot()
+
+    stop = threading.Event()
+
+    def topups(wallet_id):
+        while not stop.is_set():
+            assert wallet_service.change_balance(wallet_id, 1) is not None
+
+    def creates(first_user_id):
+        client = wallet_service.app.test_client()
+        for user_id in range(first_user_id, first_user_id + 30):
+            response = client.post('/wallets', json={}, headers=auth_headers(user_id))
+            assert response.status_code == 201
+
+    threads = [threading.Thread(target=topups, args=(wallet_id,)) for wallet_id in (1, 2, 3)]
+    threads.append(threading.Thread(target=creates, args=(1000,)))
+    for thread in threads:
+        thread.start()
+    for _ in range(20):
+        log.snapshot()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    expected = wallet_service.wallets_db.dump()
+    recovered = WalletStore()
+    monkeypatch.setattr(wallet_service, 'wallets_db', recovered)
+    WriteAheadLog(str(tmp_path)).recover(wallet_service.load_wallet_snapshot, wallet_service.apply_wallet_record)
+    assert len(recovered) == 33
+    assert recovered.dump() == expected
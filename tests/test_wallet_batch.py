@@ -0,0 +1,74 @@
+import datetime
+import json
+
+import jwt
+
+import app as wallet_service
+from common.auth import internal_headers
+
+BATCH_PATH = '/wallets/mutations/batch'
+
+
+def auth_headers(user_id):
+    token = jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, wallet_service.SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def post_batch(body, headers):
+    client = wallet_service.app.test_client()
+    return client.post(BATCH_PATH, data=body, content_type='application/json', headers=headers)
+
+
+def test_users_can_only_touch_their_own_wallets():
+    body = json.dumps({'entries': [{'wallet_id': 2, 'type': 'credit', 'amount': 5}]}).encode()
+    response = post_batch(body, auth_headers(1))
+    assert response.get_json()['results'][0]['error'] == 'Unauthorized'
+
+
+def test_signed_service_call_can_touch_any_wallet():
+    balances = [wallet_service.wallets_db.balance(wallet_id) for wallet_id in (1, 2)]
+    body = json.dumps({'atomic': True, 'entries': [
+        {'wallet_id': 1, 'type': 'credit', 'amount': 5},
+        {'wallet_id': 2, 'type': 'debit', 'amount': 5}
+    ]}).encode()
+    headers = internal_headers(wallet_service.SECRET_KEY, 'POST', BATCH_PATH, body)
+
+    response = post_batch(body, headers)
+    assert response.status_code == 200
+    assert wallet_service.wallets_db.balance(1) == balances[0] + 5
+    assert wallet_service.wallets_db.balance(2) == balances[1] - 5
+
+    # Each signature works once, and only for the body it was made for
+    assert post_batch(body, headers).status_code == 401
+    headers = internal_headers(wallet_service.SECRET_KEY, 'POST', BATCH_PATH, body)
+    assert post_batch(body.replace(b'"amount": 5', b'"amount": 9'), headers).status_code == 401
+    headers = internal_headers('not-the-secret', 'POST', BATCH_PATH, body)
+    assert post_batch(body, headers).status_code == 401
+
+
+def test_atomic_must_be_a_boolean():
+    body = json.dumps({'atomic': 'false', 'entries': [{'wallet_id': 1, 'type': 'credit', 'amount': 5}]})
+    response = post_batch(body.encode(), auth_headers(1))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'atomic must be a boolean'
+
+
+def test_boolean_wallet_ids_are_rejected():
+    # True == 1 in Python, so it must not resolve to wallet (or user) 1
+    balance = wallet_service.wallets_db.balance(1)
+    body = json.dumps({'entries': [{'wallet_id': True, 'type': 'credit', 'amount': 5}]})
+    response = post_batch(body.encode(), auth_headers(1))
+    assert response.get_json()['results'][0]['error'] == 'Wallet not found'
+
+    client = wallet_service.app.test_client()
+    for user_id, body, status in [
+        (1, {'from_wallet_id': True, 'to_wallet_id': 2, 'amount': 5}, 400),
+        (2, {'from_wallet_id': 2, 'to_wallet_id': True, 'amount': 5}, 404),
+        (2, {'from_wallet_id': 2, 'to_user_id': True, 'amount': 5}, 404)
+    ]:
+        response = client.post('/wallets/transfer', json=body, headers=auth_headers(user_id))
+        assert response.status_code == status, body
+    assert wallet_service.wallets_db.balance(1) == balance
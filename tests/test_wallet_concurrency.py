@@ -0,0 +1,118 @@
+import datetime
+import random
+import sys
+import threading
+
+import jwt
+import pytest
+
+import app as wallet_service
+
+THREADS = 16
+TRANSFERS_PER_THREAD = 300
+
+
+@pytest.fixture(autouse=True)
+def fast_switching():
+    # Ganti thread sesering mungkin supaya race lebih mudah muncul
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def create_wallets(count, balance):
+    wallet_ids = []
+    with wallet_service.wallets_lock:
+        for _ in range(count):
+            user_id = max(wallet_service.wallets_by_user) + 1
+            wallet_id = wallet_service.wallets_db.create(user_id, balance)
+            wallet_service.wallets_by_user[user_id] = wallet_id
+            wallet_ids.append(wallet_id)
+    return wallet_ids
+
+
+def token_for(wallet_id):
+    user_id = wallet_service.wallets_db.user_id(wallet_id)
+    return jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, wallet_service.SECRET_KEY, algorithm='HS256')
+
+
+def run_threads(target, count):
+    errors = []
+
+    def guarded(index):
+        try:
+            target(index)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+
+
+def balances(wallet_ids):
+    return [wallet_service.wallets_db.balance(wallet_id) for wallet_id in wallet_ids]
+
+
+def test_concurrent_transfers_conserve_balance():
+    # Sedikit wallet dan saldo kecil: banyak transfer rebutan wallet yang sama
+    # dan sebagian ditolak karena saldo tidak cukup
+    wallet_ids = create_wallets(8, 1000)
+    tokens = {wallet_id: token_for(wallet_id) for wallet_id in wallet_ids}
+    total = sum(balances(wallet_ids))
+    outcomes = {200: 0, 400: 0}
+    outcomes_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(index)
+        client = wallet_service.app.test_client()
+        for _ in range(TRANSFERS_PER_THREAD):
+            source, destination = rng.sample(wallet_ids, 2)
+            response = client.post('/wallets/transfer', json={
+                'from_wallet_id': source,
+                'to_wallet_id': destination,
+                'amount': rng.randint(1, 400)
+            }, headers={'Authorization': f'Bearer {tokens[source]}'})
+            assert response.status_code in (200, 400), response.get_json()
+            with outcomes_lock:
+                outcomes[response.status_code] += 1
+
+    run_threads(worker, THREADS)
+
+    assert sum(balances(wallet_ids)) == total
+    assert min(balances(wallet_ids)) >= 0
+    assert outcomes[200] > 0 and outcomes[400] > 0
+
+
+def test_concurrent_change_balance_is_exact():
+    wallet_id, = create_wallets(1, 0)
+
+    def worker(index):
+        for _ in range(TRANSFERS_PER_THREAD):
+            assert wallet_service.change_balance(wallet_id, 7) is not None
+            assert wallet_service.change_balance(wallet_id, -5) is not None
+
+    run_threads(worker, THREADS)
+
+    assert wallet_service.wallets_db.balance(wallet_id) == THREADS * TRANSFERS_PER_THREAD * 2
+
+
+def test_concurrent_debits_never_overdraw():
+    wallet_id, = create_wallets(1, 1000)
+    applied = []
+
+    def worker(index):
+        for _ in range(50):
+            if wallet_service.change_balance(wallet_id, -3) is not None:
+                applied.append(3)
+
+    run_threads(worker, THREADS)
+
+    assert wallet_service.wallets_db.balance(wallet_id) == 1000 - sum(applied) == 1
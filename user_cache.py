@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Lookup:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class UserExistenceCache:
+    """TTL cache of "does this user exist" answers from user-service.
+
+    fetch(user_id, token) returns True, False, or None when the answer is
+    unknown (timeout, 5xx, rejected token); only True/False are cached,
+    each with its own TTL. Concurrent lookups of the same user share one
+    fetch. invalidate() drops a user, and a fetch that was already running
+    when it was called does not write its result back.
+    """
+
+    def __init__(self, fetch, max_entries=100000, ttl=300, negative_ttl=30):
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (exists, expires_at)
+        self._lookups = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def exists(self, user_id, token):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+
+            lookup = self._lookups.get(user_id)
+            if lookup is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                lookup = self._lookups[user_id] = _Lookup()
+                self.misses += 1
+                leader = True
+            epoch = self._epoch
+
+        if not leader:
+            lookup.done.wait()
+            return bool(lookup.result)
+
+        try:
+            lookup.result = self.fetch(user_id, token)
+        finally:
+            with self._lock:
+                del self._lookups[user_id]
+                if lookup.result is not None and epoch == self._epoch and self.max_entries > 0:
+                    ttl = self.ttl if lookup.result else self.negative_ttl
+                    self._entries[user_id] = (lookup.result, time.monotonic() + ttl)
+                    self._entries.move_to_end(user_id)
+                    if len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            lookup.done.set()
+        return bool(lookup.result)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            in_flight = len(self._lookups)
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': entries,
+            'in_flight': in_flight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
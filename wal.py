@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+import time
+
+
+class WALError(Exception):
+    """A log record could not be made durable"""
+
+
+class _Commit:
+    __slots__ = ('done', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise WALError(str(self.error))
+
+
+class _Done:
+    """Commit handle returned when the log is disabled"""
+
+    def wait(self):
+        pass
+
+
+_DONE = _Done()
+_ROTATE = object()
+
+
+class WriteAheadLog:
+    """Append-only log of JSON records with group commit and snapshots.
+
+    append() gives each record a sequence number (LSN) and queues it. It is
+    cheap and meant to be called under the caller's own lock, so records of
+    one wallet are logged in the order they are applied. A writer thread
+    writes everything queued since its last fsync as one batch and fsyncs
+    once; commit.wait() returns once that batch is durable. The caller waits
+    while still holding its lock and applies the change only afterwards, so
+    memory never shows a change that is not durable; writers holding other
+    locks still share the same fsync.
+
+    Records must be idempotent (set absolute values), because snapshots are
+    taken while writes continue: a snapshot stores the LSN read before the
+    state was copied, and recovery replays every record from that LSN on
+    top of it. The log is split into segments at each snapshot, and older
+    segments are deleted once the snapshot is on disk.
+
+    A failed write or fsync is fail-stop: the batch is cut off the file, it
+    and everything still queued fail, and every later append() and snapshot
+    raises WALError. Nothing is written after the failure, so a torn batch
+    never sits in front of acknowledged records; the process has to be
+    restarted, which recovers the last durable state.
+    """
+
+    def __init__(self, directory, fsync=True, snapshot_interval=60):
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue = []
+        self._next_lsn = 0
+        self._error = None
+        self._file = None
+        self._offset = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_state = None
+        self._since_snapshot = 0
+        self.batches = 0
+        self.records = 0
+        self.snapshots = 0
+        self.last_recovery = None
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    @property
+    def broken(self):
+        """True after a write failed; the log accepts nothing until restart"""
+        return self._error is not None
+
+    def _broken_error(self):
+        return WALError(f'write-ahead log stopped after a failed write: {self._error}')
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segments(self):
+        """[(first lsn, file name)] sorted by lsn"""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith('wal-') and name.endswith('.log'):
+                segments.append((int(name[4:-4]), name))
+        return sorted(segments)
+
+    def _open_segment(self, first_lsn):
+        if self._file is not None:
+            self._file.close()
+        # Unbuffered: a failed write leaves nothing behind to be flushed later
+        self._file = open(self._path(f'wal-{first_lsn:020d}.log'), 'ab', buffering=0)
+        self._offset = os.fstat(self._file.fileno()).st_size
+
+    # ----- recovery -----
+
+    def recover(self, load_snapshot, apply_record):
+        """Rebuild state: load_snapshot(state) once, then apply_record(record) per log record.
+
+        Returns False when there is nothing on disk yet (fresh start).
+        """
+        if not self.enabled:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.monotonic()
+
+        snapshot_lsn = 0
+        found = False
+        if os.path.exists(self._path('snapshot.json')):
+            with open(self._path('snapshot.json'), encoding='utf-8') as f:
+                snapshot = json.load(f)
+            snapshot_lsn = snapshot['lsn']
+            load_snapshot(snapshot['state'])
+            found = True
+
+        replayed = 0
+        next_lsn = snapshot_lsn
+        for _, name in self._segments():
+            with open(self._path(name), 'rb') as f:
+                valid_bytes = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write at the tail from a crash; it was never acknowledged
+                        break
+                    valid_bytes += len(line)
+                    if record['lsn'] >= snapshot_lsn:
+                        apply_record(record)
+                        replayed += 1
+                    next_lsn = max(next_lsn, record['lsn'] + 1)
+            if valid_bytes < os.path.getsize(self._path(name)):
+                os.truncate(self._path(name), valid_bytes)
+            found = True
+
+        self._next_lsn = next_lsn
+        self.last_recovery = {
+            'snapshot_lsn': snapshot_lsn,
+            'replayed': replayed,
+            'seconds': round(time.monotonic() - started, 3)
+        }
+        return found
+
+    def start(self, snapshot_state):
+        """Start the writer and snapshot threads; snapshot_state() returns the state to save"""
+        if not self.enabled:
+            return
+        self._snapshot_state = snapshot_state
+        self._open_segment(self._next_lsn)
+        threading.Thread(target=self._write_loop, name='wal-writer', daemon=True).start()
+        if self.snapshot_interval > 0:
+            threading.Thread(target=self._snapshot_loop, name='wal-snapshot', daemon=True).start()
+
+    # ----- logging -----
+
+    def append(self, record):
+        """Queue a record and return a commit handle; apply the change only after .wait() returns"""
+        if not self.enabled:
+            return _DONE
+        commit = _Commit()
+        with self._cond:
+            if self._error is not None:
+                raise self._broken_error()
+            record['lsn'] = lsn = self._next_lsn
+            self._next_lsn += 1
+            self._queue.append((json.dumps(record, separators=(',', ':')).encode(), commit, lsn))
+            self._cond.notify()
+        return commit
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch, self._queue = self._queue, []
+
+            pending = []
+            for item in batch:
+                if item[0] is _ROTATE:
+                    self._flush(pending)
+                    pending = []
+                    self._rotate(item[1], item[2])
+                else:
+                    pending.append(item)
+            self._flush(pending)
+
+    def _flush(self, pending):
+        if not pending:
+            return
+        if self._error is None:
+            data = b''.join(line + b'\n' for line, _, _ in pending)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[self._file.write(view):]
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError as e:
+                self._fail(e)
+            else:
+                self._offset += len(data)
+                self.batches += 1
+                self.records += len(pending)
+                self._since_snapshot += len(pending)
+        for _, commit, _ in pending:
+            commit.error = self._error
+            commit.done.set()
+
+    def _rotate(self, first_lsn, commit):
+        if self._error is None:
+            try:
+                self._open_segment(first_lsn)
+            except OSError as e:
+                self._fail(e)
+        commit.error = self._error
+        commit.done.set()
+
+    def _fail(self, error):
+        """Stop for good: cut the failed batch off the file, never write again"""
+        print(f'WAL write failed, rejecting all changes until restart: {error}')
+        try:
+            os.ftruncate(self._file.fileno(), self._offset)
+        except (OSError, ValueError):
+            # Recovery drops a torn tail anyway; nothing is written after it
+            pass
+        with self._cond:
+            self._error = error
+
+    # ----- snapshots -----
+
+    def snapshot(self):
+        """Write a snapshot and drop the log segments it covers"""
+        if not self.enabled:
+            return
+        with self._snapshot_lock:
+            # New segment starts at the snapshot LSN; earlier records are all in
+            # older segments, which are deleted once the snapshot is saved
+            rotated = _Commit()
+            with self._cond:
+                if self._error is not None:
+                    raise self._broken_error()
+                lsn = self._next_lsn
+                self._queue.append((_ROTATE, lsn, rotated))
+                self._cond.notify()
+            rotated.wait()
+            self._since_snapshot = 0
+
+            # snapshot_state must include every record below lsn. The caller
+            # applies a change only after its commit succeeds, and copies the
+            # state under the same locks, so the copy holds every committed
+            # change and none that failed. It may also hold some records from
+            # the new segment; those are replayed again on top of it, which
+            # is harmless because records carry absolute values.
+            state = self._snapshot_state()
+            with self._cond:
+                if self._error is not None:
+                    raise self._broken_error()
+            tmp = self._path(f'snapshot.json.{os.getpid()}.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'lsn': lsn, 'state': state}, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path('snapshot.json'))
+            self._fsync_directory()
+
+            for first_lsn, name in self._segments():
+                if first_lsn < lsn:
+                    os.remove(self._path(name))
+            self.snapshots += 1
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            if self._error is not None:
+                return
+            if self._since_snapshot:
+                try:
+                    self.snapshot()
+                except (OSError, WALError) as e:
+                    print(f'WAL snapshot failed: {e}')
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'fsync': self.fsync,
+            'broken': self.broken,
+            'error': str(self._error) if self._error is not None else None,
+            'next_lsn': self._next_lsn,
+            'records': self.records,
+            'batches': self.batches,
+            'avg_batch': round(self.records / self.batches, 2) if self.batches else 0.0,
+            'snapshots': self.snapshots,
+            'last_recovery': self.last_recovery
+        }
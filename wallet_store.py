@@ -0,0 +1,145 @@
+import base64
+import sys
+from array import array
+
+# Largest balance an int64 column can hold
+MAX_BALANCE = 2 ** 63 - 1
+
+
+class WalletStore:
+    """Wallets kept in parallel typed arrays indexed by wallet id.
+
+    user_id and balance are int64 arrays; currency and status are one-byte
+    codes into small interned tables. That is about 18 bytes per wallet,
+    instead of a five-key dict per wallet. Wallet ids are assigned
+    sequentially, so the arrays stay dense; status code 0 marks an unused
+    slot. Dicts are only built by to_dict() at the JSON boundary.
+
+    Single-element reads and writes are atomic under the GIL. create() and
+    put() grow the arrays and must be serialized by the caller.
+    """
+
+    def __init__(self):
+        self._user_ids = array('q', [0])
+        self._balances = array('q', [0])
+        self._currency = bytearray(1)
+        self._status = bytearray(1)
+        self._currencies = [None]
+        self._statuses = [None]
+        self._count = 0
+
+    def _code(self, table, value):
+        try:
+            return table.index(value)
+        except ValueError:
+            if len(table) > 255:
+                raise ValueError(f'Too many distinct values: {value}')
+            table.append(value)
+            return len(table) - 1
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, wallet_id):
+        # bool is an int subclass; True must not mean wallet 1
+        return (isinstance(wallet_id, int) and not isinstance(wallet_id, bool)
+                and 0 < wallet_id < len(self._status) and self._status[wallet_id] != 0)
+
+    @property
+    def next_id(self):
+        return len(self._status)
+
+    def put(self, wallet_id, user_id, balance=0, currency='IDR', status='active'):
+        """Insert or overwrite a wallet with a given id"""
+        if wallet_id >= len(self._status):
+            grow = wallet_id + 1 - len(self._status)
+            self._user_ids.frombytes(bytes(8 * grow))
+            self._balances.frombytes(bytes(8 * grow))
+            self._currency.extend(bytes(grow))
+            self._status.extend(bytes(grow))
+        if self._status[wallet_id] == 0:
+            self._count += 1
+        self._user_ids[wallet_id] = user_id
+        self._balances[wallet_id] = balance
+        self._currency[wallet_id] = self._code(self._currencies, currency)
+        self._status[wallet_id] = self._code(self._statuses, status)
+
+    def create(self, user_id, balance=0, currency='IDR', status='active'):
+        """Add a wallet under the next id and return the id"""
+        wallet_id = self.next_id
+        self.put(wallet_id, user_id, balance, currency, status)
+        return wallet_id
+
+    def user_id(self, wallet_id):
+        return self._user_ids[wallet_id]
+
+    def balance(self, wallet_id):
+        return self._balances[wallet_id]
+
+    def set_balance(self, wallet_id, balance):
+        self._balances[wallet_id] = balance
+
+    def currency(self, wallet_id):
+        return self._currencies[self._currency[wallet_id]]
+
+    def ids(self):
+        status = self._status
+        return [wallet_id for wallet_id in range(1, len(status)) if status[wallet_id]]
+
+    def to_dict(self, wallet_id):
+        return {
+            'id': wallet_id,
+            'user_id': self._user_ids[wallet_id],
+            'balance': self._balances[wallet_id],
+            'currency': self._currencies[self._currency[wallet_id]],
+            'status': self._statuses[self._status[wallet_id]]
+        }
+
+    def clear(self):
+        self.__init__()
+
+    def copy(self):
+        """Copy of the columns (a memcpy per array, cheap enough to take under a lock)"""
+        store = WalletStore.__new__(WalletStore)
+        store._user_ids = self._user_ids[:]
+        store._balances = self._balances[:]
+        store._currency = self._currency[:]
+        store._status = self._status[:]
+        store._currencies = list(self._currencies)
+        store._statuses = list(self._statuses)
+        store._count = self._count
+        return store
+
+    def dump(self):
+        """Columns for a snapshot, as base64 of the raw arrays (copied, so writes can continue)"""
+        encode = lambda data: base64.b64encode(data).decode()
+        return {
+            'byteorder': sys.byteorder,
+            'user_ids': encode(self._user_ids.tobytes()),
+            'balances': encode(self._balances.tobytes()),
+            'currency': encode(bytes(self._currency)),
+            'status': encode(bytes(self._status)),
+            'currencies': list(self._currencies),
+            'statuses': list(self._statuses)
+        }
+
+    def load(self, columns):
+        user_ids = array('q', base64.b64decode(columns['user_ids']))
+        balances = array('q', base64.b64decode(columns['balances']))
+        if columns['byteorder'] != sys.byteorder:
+            user_ids.byteswap()
+            balances.byteswap()
+        self._user_ids = user_ids
+        self._balances = balances
+        self._currency = bytearray(base64.b64decode(columns['currency']))
+        self._status = bytearray(base64.b64decode(columns['status']))
+        self._currencies = list(columns['currencies'])
+        self._statuses = list(columns['statuses'])
+        # Columns are copied one after another while wallets may be created,
+        # so they can differ in length; the missing fields come from WAL replay
+        size = max(len(self._user_ids), len(self._balances), len(self._currency), len(self._status))
+        for column in (self._user_ids, self._balances):
+            column.frombytes(bytes(8 * (size - len(column))))
+        for column in (self._currency, self._status):
+            column.extend(bytes(size - len(column)))
+        self._count = size - self._status.count(0)